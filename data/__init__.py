@@ -1,6 +1,8 @@
 import torch
 import torchaudio
 
+from data.resample import resample
+
 SONG_ID = 'song_id'
 START_TIME = 'start_time'
 END_TIME = 'end_time'
@@ -17,17 +19,18 @@ DYNAMIC_VALENCE_STD = 'dynamic_valence_std'
 DYNAMIC_AROUSAL_MEAN = 'dynamic_arousal_mean'
 DYNAMIC_AROUSAL_STD = 'dynamic_arousal_std'
 
-def preprocess_audio(frame_count, audio, sr, ret_sr):
+def resample_audio(audio, sr, ret_sr):
     x = torch.mean(audio, 0, True)
-    out = torch.zeros(1, frame_count)
-    effects = [
-        ["rate", f"{ret_sr}"]
-    ]
-    x, sr2 = torchaudio.sox_effects.apply_effects_tensor(x, sr, effects)
-    if frame_count >= x.shape[1]:
-        out[:, :x.shape[1]] = x
-    else:
-        out[:, :] = x[:, :frame_count]
+    return resample(x, sr, ret_sr)
+
+def fit_frames(frame_count, x, offset=0):
+    out = torch.zeros(1, frame_count, dtype=x.dtype)
+    x = x[:, offset:offset + frame_count]
+    out[:, :x.shape[1]] = x
+    return out
+
+def preprocess_audio(frame_count, audio, sr, ret_sr):
+    x = resample_audio(audio, sr, ret_sr)
     # out = torch.squeeze(out)
     # out = torch.unsqueeze(out, dim=1)
-    return out
\ No newline at end of file
+    return fit_frames(frame_count, x)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+SONG_CACHE_SIZE = 128 * 1024 * 1024
+
+class SongAudioCache:
+    """
+    LRU cache of decoded (mono, resampled) songs bounded by the total number
+    of bytes held. The cache lives on the dataset instance, so every DataLoader
+    worker ends up with its own copy after the fork.
+    """
+
+    def __init__(self, max_bytes=SONG_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.items = OrderedDict()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def get(self, key):
+        x = self.items.get(key)
+        if not x is None:
+            self.items.move_to_end(key)
+        return x
+
+    def put(self, key, x):
+        n = self.__size(x)
+        if n > self.max_bytes:
+            return
+        if key in self.items:
+            self.n_bytes -= self.__size(self.items.pop(key))
+        while self.n_bytes + n > self.max_bytes:
+            (_, old) = self.items.popitem(last=False)
+            self.n_bytes -= self.__size(old)
+        self.items[key] = x
+        self.n_bytes += n
+
+    def clear(self):
+        self.items.clear()
+        self.n_bytes = 0
+
+    def __size(self, x):
+        return x.element_size() * x.nelement()
@@ -1,60 +1,196 @@
+import hashlib
+import json
 import pickle
-import random
+import tempfile
 from os import path
 import os
-import string
 
 import pandas as pd
 import numpy as np
 
+import torchaudio
 from torch.utils.data import Dataset
 
 from data import *
+from data.audio_cache import SongAudioCache, SONG_CACHE_SIZE
+from data.store import SongArrayStore
+from data.meta import MetaTable
+from data.lyrics import LyricsIndex
+from data.embeddings import LyricsEmbeddingStore, BERT_MODEL, POOLED, SEQUENCE
+from data.mp3_index import Mp3IndexCache
+from data.catalog import MediaCatalog
+from data.transcode import load_manifest, load_audio, get_transcode_dir, is_current
+from data.resample import DeferredAudio, ResampleCollate, get_resampler_config
+from data.profile import DataProfiler
+from data.precision import to_storage, check_dtype, FLOAT32, WAVEFORM_DTYPES, FEATURE_DTYPES
+from data.spectrogram import SpectrogramStore
+from utils.fs import make_private_dir
+
+def calculate_frames(starts, ends, chunk_duration, overlap):
+    """
+    (meta_index, frame) pair for every chunk as an (n, 2) int64 array
+
+    songs shorter than one hop but at least one chunk long get a single
+    chunk, those rows do not advance the meta index (same as the original
+    iterrows loop, kept so cache keys and splits stay identical)
+    """
+    durations = ends - starts
+    n_frames = np.floor((durations - 1) / (chunk_duration - overlap)).astype(np.int64)
+    single = (n_frames == 0) & (chunk_duration <= durations)
+    counts = np.where(single, 1, np.maximum(n_frames, 0))
+
+    row_index = np.arange(len(durations), dtype=np.int64) - (np.cumsum(single) - single)
+    first = np.cumsum(counts) - counts
+
+    frames = np.empty((int(counts.sum()), 2), dtype=np.int64)
+    frames[:, 0] = np.repeat(row_index, counts)
+    frames[:, 1] = np.arange(len(frames), dtype=np.int64) - np.repeat(first, counts)
+    return frames
 
 class BaseDataset(Dataset):
 
-    def __get_temp_folder(self, length=8):
-        fname = ''.join(random.choices(
-            string.ascii_uppercase + string.digits, k=length))
-        return path.join("/tmp/", fname)
+    # 2: torchaudio resampling instead of sox, transcoded copies and mp3
+    # frame seeking
+    CACHE_VERSION = 2
 
-    def __check_cache_and_get_features(self, info, args):
+    def __get_temp_folder(self):
+        # cache entries are unpickled, so the default folder under the
+        # shared temp dir belongs to the current user alone
+        return make_private_dir(path.join(tempfile.gettempdir(), "mer-cache-{}".format(os.getuid())))
+
+    def __get_cache_file(self, info, args):
         key = self.get_key(info, args)
-        fkey = path.join(self.temp_folder, "{}.pkl".format(key))
+        return path.join(self.get_cache_dir(), "{}.pkl".format(key))
+
+    def read_cache_entry(self, fkey):
+        """
+        cached features, None if there are none (or force_compute)
+        """
         if (not self.force_compute) and path.exists(fkey):
             try:
-                X = pickle.load(open(fkey, mode="rb"))
-                return X
+                with open(fkey, mode="rb") as f:
+                    return pickle.load(f)
             except:
                 print("Warning: failed to load pickle file. getting features... {}".format(fkey))
-        X = self.get_features(info, args)
-        pickle.dump(X, open(fkey, mode="wb"))
+        return None
+
+    def write_cache_entry(self, fkey, X):
+        # write-then-rename so concurrent workers and sweep agents sharing the
+        # cache never see a partially written entry
+        tmp_fkey = "{}.{}.tmp".format(fkey, os.getpid())
+        with open(tmp_fkey, mode="wb") as f:
+            pickle.dump(X, f)
+        os.replace(tmp_fkey, fkey)
+
+    def __check_cache_and_get_features(self, info, args):
+        fkey = self.__get_cache_file(info, args)
+        X = self.read_cache_entry(fkey)
+        if X is None:
+            X = self.get_features(info, args)
+            self.write_cache_entry(fkey, X)
         return X
 
-    def __get_meta(self, meta_file):
+    def use_feature_cache(self):
+        return True
+
+    def compact_stores(self):
+        """
+        fold the index logs of the song stores once a bulk fill is done
+        """
+        pass
+
+    def __parse_meta(self, meta_file):
         meta_ext = path.splitext(meta_file)[1]
         if meta_ext == ".json":
-            return pd.read_json(meta_file)
+            return MetaTable.from_frame(pd.read_json(meta_file))
         elif meta_ext == ".csv":
-            return pd.read_csv(meta_file)
+            return MetaTable.from_frame(pd.read_csv(meta_file))
         else:
             raise Exception("Unknown File Extension {}".format(meta_ext))
 
-    def __init__(self, meta_file, temp_folder=None, force_compute=False):
+    def __get_meta(self, meta_file):
+        # parsed splits are kept as columnar .npz keyed by the source file's
+        # content, so a changed split is converted again
+        h = hashlib.sha1()
+        with open(meta_file, mode="rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        cache_dir = path.join(self.temp_folder, "meta")
+        cache_file = path.join(cache_dir, "{}-{}.npz".format(
+            path.splitext(path.basename(meta_file))[0], h.hexdigest()[:16]))
+        if path.exists(cache_file):
+            try:
+                return MetaTable.load(cache_file)
+            except:
+                print("Warning: failed to load meta cache. parsing meta... {}".format(cache_file))
+
+        meta = self.__parse_meta(meta_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        with open(tmp_file, mode="wb") as f:
+            meta.save(f)
+        os.replace(tmp_file, cache_file)
+        return meta
+
+    def __init__(self, meta_file, temp_folder=None, force_compute=False, profile=False):
 
         self.force_compute = force_compute
-        self.meta = self.__get_meta(meta_file)
         if force_compute == True:
             print("Warning: Using Force Compute")
 
         if temp_folder is None:
             temp_folder = self.__get_temp_folder()
-        if not path.exists(temp_folder):
-            os.mkdir(temp_folder)
+        os.makedirs(temp_folder, exist_ok=True)
         self.temp_folder = temp_folder
+        self.cache_dir = None
+
+        self.meta = self.__get_meta(meta_file)
+
+        # optional per-stage timings, see data.profile
+        self.profiler = None
+        if profile:
+            DataProfiler().enable(self)
 
         self.count = len(self.meta)
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if not self.profiler is None:
+            state = self.profiler.get_dataset_state(state)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if not self.profiler is None:
+            self.profiler.enable(self)
+
+    def get_cache_config(self):
+        """
+        everything that changes the output of get_features, subclasses add
+        their own parameters on top
+        """
+        return {
+            'class': "{}.{}".format(type(self).__module__, type(self).__name__),
+            'version': self.CACHE_VERSION
+        }
+
+    def get_cache_hash(self):
+        config = json.dumps(self.get_cache_config(), sort_keys=True)
+        return hashlib.sha1(config.encode("utf-8")).hexdigest()[:16]
+
+    def get_cache_dir(self):
+        """
+        features are stored under <temp_folder>/<class>-<config hash> so that
+        a changed sr/duration/overlap/class never picks up stale entries and
+        identical configs share one cache across runs
+        """
+        if self.cache_dir is None:
+            cache_dir = path.join(self.temp_folder, "{}-{}".format(
+                type(self).__name__, self.get_cache_hash()))
+            os.makedirs(cache_dir, exist_ok=True)
+            self.cache_dir = cache_dir
+        return self.cache_dir
+
     def get_key(sekf, info, args):
         k = "{}".format(info[SONG_ID])
         if not args is None:
@@ -64,6 +200,26 @@ class BaseDataset(Dataset):
     def get_features(self, info, args):
         raise NotImplementedError()
 
+    def get_song_index(self, index):
+        return index
+
+    def is_cached(self, index):
+        if not self.use_feature_cache():
+            return True
+        (info, args) = self.get_info(index)
+        fkey = self.__get_cache_file(info, args)
+        return path.exists(fkey) and path.getsize(fkey) > 0
+
+    def precompute(self, index):
+        """
+        fill the feature cache for `index` without building the label
+        """
+        (info, args) = self.get_info(index)
+        if self.use_feature_cache():
+            self.__check_cache_and_get_features(info, args)
+        else:
+            self.get_features(info, args)
+
     def get_label(self, info, args):
         return info[QUADRANT]
 
@@ -71,59 +227,412 @@ class BaseDataset(Dataset):
         return self.meta[QUADRANT]
 
     def get_info(self, index):
-        return (self.meta.iloc[index], None)
+        return (self.meta.record(index), None)
 
     def __len__(self):
         return self.count
 
     def __getitem__(self, index):
+        return self.get_item(index)
+
+    def get_item(self, index):
         (info, args) = self.get_info(index)
-        X = self.__check_cache_and_get_features(info, args)
-        # X = self.get_features(info, args)
+        if self.use_feature_cache():
+            X = self.__check_cache_and_get_features(info, args)
+        else:
+            X = self.get_features(info, args)
         y = self.get_label(info, args)
         return (X, y)
 
 class BaseChunkedDataset(BaseDataset):
 
     def __calculate_frames(self, meta, chunk_duration, overlap):
-        frames = []
-        row_i = 0
-        for (i, row) in meta.iterrows():
-            start_time = row[START_TIME]
-            end_time = row[END_TIME]
-            duration = end_time - start_time
-            n_frames = int(np.floor((duration - 1) /
-                           (chunk_duration - overlap)))
-            if n_frames == 0 and chunk_duration <= duration:
-                frames.append((row_i, 0))
-                continue
-            for j in range(n_frames):
-                frames.append((row_i, j))
-            row_i += 1
-        return frames
+        starts = np.asarray(meta[START_TIME], dtype=np.float64)
+        ends = np.asarray(meta[END_TIME], dtype=np.float64)
+        if not self.media_catalog is None:
+            ends = self.__clip_to_durations(meta, ends)
+        return calculate_frames(starts, ends, chunk_duration, overlap)
+
+    def __clip_to_durations(self, meta, ends):
+        # chunks past the real end of a file would only be zero padding
+        durations = np.array([self.media_catalog.get_duration(self.get_audio_file(meta.record(i)))
+                              for i in range(len(meta))], dtype=np.float64)
+        known = ~np.isnan(durations)
+        short = known & (durations < ends - 0.5)
+        if short.any():
+            print("Warning: {} audio files are shorter than their {}: {}".format(
+                int(short.sum()), END_TIME, ", ".join(str(x) for x in meta[SONG_ID][short][:10])))
+        return np.where(known, np.minimum(ends, durations), ends)
+
+    def __get_media_catalog(self):
+        try:
+            audio_files = [self.get_audio_file(self.meta.record(i)) for i in range(len(self.meta))]
+        except NotImplementedError:
+            return None
+        return MediaCatalog(audio_files, cache_dir=path.join(self.temp_folder, "catalog"))
 
     def get_labels(self):
         return self.labels
 
-    def __init__(self, meta_file, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False):
-        super().__init__(meta_file, temp_folder=temp_folder, force_compute=force_compute)
+    def __init__(self, meta_file, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, song_cache_size=SONG_CACHE_SIZE, waveform_store=False, waveform_dtype=FLOAT32, feature_dtype=FLOAT32, transcoded=True, mp3_index=True, media_catalog=False, deferred_resample=False, spectrograms=None, profile=False):
+        super().__init__(meta_file, temp_folder=temp_folder, force_compute=force_compute, profile=profile)
 
+        # storage precision of cached waveforms (float32/float16/int16 PCM) and
+        # of other cached features (float32/float16), models upcast on device
+        self.waveform_dtype = check_dtype(waveform_dtype, WAVEFORM_DTYPES)
+        self.feature_dtype = check_dtype(feature_dtype, FEATURE_DTYPES)
+
+        self.sr = sr
         self.chunk_duration = chunk_duration
         self.overlap = overlap
+        self.frame_count = int(self.sr * self.chunk_duration)
+
+        # media_catalog: read the headers of the audio files up front so chunk
+        # counts follow the real durations (this changes len() and the kfold
+        # splits compared to END_TIME alone)
+        self.media_catalog = None
+        if media_catalog:
+            self.media_catalog = self.__get_media_catalog()
 
         self.frames = self.__calculate_frames(
             self.meta, self.chunk_duration, self.overlap)
         self.count = len(self.frames)
 
 
-        self.labels = np.array(
-            list(map(lambda x: self.meta.iloc[x[0]][QUADRANT], self.frames))
-        )
+        self.labels = self.meta[QUADRANT][self.frames[:, 0]]
+
+        # chunks read one by one stay at the file's rate and are resampled
+        # per batch in the collate (see get_collate_fn), whole songs are not
+        # decoded so the song cache is off
+        if deferred_resample and (waveform_store or spectrograms):
+            raise Exception("deferred_resample reads chunks one by one, it does not work with waveform_store or spectrograms")
+        self.deferred_resample = deferred_resample
+
+        self.song_cache = SongAudioCache(0 if deferred_resample else song_cache_size)
+
+        # audio folder -> manifest of its copy transcoded to self.sr (exec.py transcode)
+        self.transcoded = transcoded
+        self.transcode_manifests = {}
+        # audio file -> its up to date transcoded copy or None, checked once
+        self.transcoded_files = {}
+
+        # frame byte offsets of mp3 files so a chunk decodes only its own frames
+        self.mp3_indices = None
+        if mp3_index:
+            self.mp3_indices = Mp3IndexCache(path.join(self.temp_folder, "mp3-index"))
+
+        self.waveform_store = None
+        if waveform_store:
+            # keyed by song id only, so named after everything that changes
+            # the decoded songs
+            self.waveform_store = SongArrayStore(
+                path.join(self.temp_folder, "waveforms"), self.get_store_name("{}-{}".format(self.sr, self.waveform_dtype), {
+                    **self.get_song_config(),
+                    'dtype': self.waveform_dtype
+                }), dtype=self.waveform_dtype)
+
+        # spectrograms: front end parameters (n_fft, n_mels, n_mfcc, n_cqt) to
+        # yield {"audio", "stft", "mel_spec", "mfcc"[, "cqt"]} with the
+        # spectrograms sliced from whole songs instead of the audio alone
+        self.spectrograms = None
+        if spectrograms:
+            self.spectrograms = SpectrogramStore(
+                path.join(self.temp_folder, "spectrograms"), sr=self.sr, dtype=self.feature_dtype,
+                source={**self.get_source_config(), **self.get_song_config()},
+                **({} if spectrograms == True else spectrograms))
+
+    def use_feature_cache(self):
+        # with the waveform store every chunk is a view into the memory map,
+        # pickling it again per (song, frame) would only duplicate the store
+        return self.waveform_store is None
+
+    def get_source_config(self):
+        """
+        where the audio comes from, the cache and the song stores are shared
+        across datasets under one temp folder so they are namespaced by it
+        """
+        data_dir = getattr(self, "data_dir", None)
+        return {
+            'data_dir': None if data_dir is None else path.realpath(data_dir),
+            'audio_extension': getattr(self, "audio_extension", None)
+        }
+
+    def get_song_config(self):
+        """
+        everything besides the source that changes the decoded songs
+        """
+        return {
+            'sr': self.sr,
+            'resampler': get_resampler_config(),
+            'transcoded': self.transcoded,
+            'version': self.CACHE_VERSION
+        }
+
+    def get_store_name(self, prefix, config):
+        """
+        name of a song store of this dataset, `prefix` followed by a hash of
+        the audio source and `config`
+        """
+        config = json.dumps({**self.get_source_config(), **config}, sort_keys=True)
+        return "{}-{}".format(prefix, hashlib.sha1(config.encode("utf-8")).hexdigest()[:16])
+
+    def compact_stores(self):
+        if not self.waveform_store is None:
+            self.waveform_store.compact()
+        if not self.spectrograms is None:
+            self.spectrograms.compact()
+
+    def get_cache_config(self):
+        return {
+            **super().get_cache_config(),
+            **self.get_source_config(),
+            'sr': self.sr,
+            'chunk_duration': self.chunk_duration,
+            'overlap': self.overlap,
+            'waveform_dtype': self.waveform_dtype,
+            'feature_dtype': self.feature_dtype,
+            'deferred_resample': self.is_resample_deferred(),
+            'resampler': get_resampler_config(),
+            'transcoded': self.transcoded,
+            'mp3_index': not self.mp3_indices is None,
+            'spectrograms': None if self.spectrograms is None else self.spectrograms.get_params()
+        }
 
     def get_info(self, index):
         (meta_index, frame) = self.frames[index]
-        info = self.meta.iloc[meta_index]
+        info = self.meta.record(meta_index)
         return (info, frame)
 
-# class BaseChunkedLyricsDataset(BaseChunkedDataset):
-    
\ No newline at end of file
+    def get_song_index(self, index):
+        return self.frames[index][0]
+
+    def is_cached(self, index):
+        if self.waveform_store is None or self.use_feature_cache():
+            return super().is_cached(index)
+        (info, _) = self.get_info(index)
+        if not self.spectrograms is None and not info[SONG_ID] in self.spectrograms:
+            return False
+        return info[SONG_ID] in self.waveform_store
+
+    def precompute(self, index):
+        if self.waveform_store is None or self.use_feature_cache():
+            return super().precompute(index)
+        (info, _) = self.get_info(index)
+        self.get_song(info)
+        self.__compute_spectrograms(info)
+
+    def get_audio_file(self, info):
+        raise NotImplementedError()
+
+    def get_transcoded_file(self, info):
+        """
+        mono copy of the audio file already at self.sr, None if there is none
+        """
+        if not self.transcoded:
+            return None
+        audio_file = self.get_audio_file(info)
+        if audio_file in self.transcoded_files:
+            return self.transcoded_files[audio_file]
+        audio_dir = path.dirname(audio_file)
+        if not audio_dir in self.transcode_manifests:
+            self.transcode_manifests[audio_dir] = load_manifest(audio_dir, self.sr)
+        manifest = self.transcode_manifests[audio_dir]
+        transcoded_file = None
+        entry = None if manifest is None else manifest['files'].get(path.basename(audio_file))
+        if not entry is None:
+            if is_current(entry, audio_file):
+                transcoded_file = path.join(get_transcode_dir(audio_dir, self.sr), entry['file'])
+            else:
+                print("Warning: {} changed since it was transcoded, decoding the source".format(audio_file))
+        self.transcoded_files[audio_file] = transcoded_file
+        return transcoded_file
+
+    def get_audio(self, info, args):
+        frame = args
+        transcoded_file = self.get_transcoded_file(info)
+        if not transcoded_file is None:
+            offset = int(self.sr * ((self.overlap * frame) + info[START_TIME]))
+            return (load_audio(transcoded_file, frame_offset=offset, num_frames=self.frame_count), self.sr)
+
+        audio_file = self.get_audio_file(info)
+        index = None
+        if not self.mp3_indices is None and audio_file.endswith(".mp3"):
+            index = self.mp3_indices.get(audio_file)
+        if not index is None:
+            offset = int(index.sr * ((self.overlap * frame) + info[START_TIME]))
+            return index.load(audio_file, frame_offset=offset, num_frames=int(index.sr * self.chunk_duration))
+
+        media_info = None
+        if not self.media_catalog is None:
+            media_info = self.media_catalog.get(audio_file)
+        if media_info is None:
+            media_info = torchaudio.info(audio_file)
+        sr = media_info.sample_rate
+
+        offset = int(sr * ((self.overlap * frame) + info[START_TIME]))
+        frames = int(sr * self.chunk_duration)
+
+        x, sr = torchaudio.load(
+            audio_file, frame_offset=offset, num_frames=frames)
+        return (x, sr)
+
+    def decode_song(self, info):
+        transcoded_file = self.get_transcoded_file(info)
+        if not transcoded_file is None:
+            return load_audio(transcoded_file)
+        audio_file = self.get_audio_file(info)
+        x, sr = torchaudio.load(audio_file)
+        return resample_audio(x, sr, self.sr)
+
+    def get_song(self, info):
+        """
+        whole song decoded and resampled to self.sr once, then served either
+        from the memory-mapped waveform store or from the worker's song cache
+        so that all of its chunks are slices of it
+        """
+        if not self.waveform_store is None:
+            x = self.waveform_store.get(info[SONG_ID])
+            if x is None:
+                x = to_storage(self.decode_song(info), self.waveform_dtype)
+                self.waveform_store.put(info[SONG_ID], x[0])
+                x = self.waveform_store.get(info[SONG_ID])
+            return torch.unsqueeze(x, 0)
+        audio_file = self.get_audio_file(info)
+        x = self.song_cache.get(audio_file)
+        if x is None:
+            x = self.decode_song(info)
+            self.song_cache.put(audio_file, x)
+        return x
+
+    def is_resample_deferred(self):
+        return self.deferred_resample
+
+    def get_collate_fn(self):
+        if self.is_resample_deferred():
+            return ResampleCollate(self.sr, self.frame_count)
+        return None
+
+    def get_chunk(self, info, args):
+        x = self.get_audio_chunk(info, args)
+        if self.spectrograms is None:
+            return x
+        offset = self.get_chunk_offset(info, args)
+        self.__compute_spectrograms(info)
+        length = self.get_song(info).shape[1]
+        return {'audio': x, **self.spectrograms.get_chunk(info[SONG_ID], x, offset, length)}
+
+    def get_chunk_offset(self, info, frame):
+        offset = int(self.sr * ((self.overlap * frame) + info[START_TIME]))
+        if not self.spectrograms is None:
+            # on the hop grid of the spectrograms, so the chunk's frames are
+            # frames of the song
+            offset = self.spectrograms.align(offset)
+        return offset
+
+    def __compute_spectrograms(self, info):
+        if not self.spectrograms is None and not info[SONG_ID] in self.spectrograms:
+            self.spectrograms.put(info[SONG_ID], self.get_song(info))
+
+    def get_audio_chunk(self, info, args):
+        # with spectrograms the chunk is a slice of the song they are computed from
+        if self.waveform_store is None and not self.song_cache.enabled and self.spectrograms is None:
+            x, sr = self.get_audio(info, args)
+            if self.is_resample_deferred():
+                return DeferredAudio(torch.mean(x, 0, True), sr)
+            x = preprocess_audio(self.frame_count, x, sr, self.sr)
+            return to_storage(x, self.waveform_dtype)
+        offset = self.get_chunk_offset(info, args)
+        x = self.get_song(info)
+        if not self.use_feature_cache() and offset + self.frame_count <= x.shape[1]:
+            # zero-copy, the tensor shares memory with the whole song
+            return x[:, offset:offset + self.frame_count]
+        return to_storage(fit_frames(self.frame_count, x, offset), self.waveform_dtype)
+
+class BaseChunkedLyricsDataset(BaseChunkedDataset):
+
+    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3", lyrics_embeddings=None, lyrics_model=BERT_MODEL, **kwargs):
+        self.data_dir = data_dir
+        self.audio_dir = path.join(data_dir, "audio")
+        self.lyrics_dir = path.join(data_dir, "lyrics")
+        self.audio_extension = audio_extension
+
+        super().__init__(meta_file, sr=sr, chunk_duration=chunk_duration, overlap=overlap,
+                         temp_folder=temp_folder, force_compute=force_compute, **kwargs)
+
+        song_ids = self.meta[SONG_ID][self.meta['lyrics'] == 1]
+        self.lyrics = LyricsIndex(self.lyrics_dir, song_ids,
+                                  cache_dir=path.join(self.temp_folder, "lyrics"))
+
+        # lyrics_embeddings: "pooled" (or True) / "sequence" to yield
+        # precomputed outputs of the frozen lyrics_model instead of raw text
+        self.lyrics_embeddings = None
+        self.lyrics_tokens = None
+        if lyrics_embeddings:
+            kind = POOLED if lyrics_embeddings == True else lyrics_embeddings
+            self.lyrics_embeddings = LyricsEmbeddingStore(
+                path.join(self.temp_folder, "embeddings"), model_name=lyrics_model, kind=kind,
+                dtype=self.feature_dtype)
+            texts = self.__get_lyrics_windows()
+            self.lyrics_embeddings.compute(texts)
+            if kind == SEQUENCE:
+                # token sequences are zero padded to the longest window of the
+                # dataset so the default collate can stack them
+                self.lyrics_tokens = max([self.lyrics_embeddings.get_length(t) for t in texts], default=0)
+
+    def __get_lyrics_windows(self):
+        texts = set()
+        for index in range(len(self)):
+            (info, args) = self.get_info(index)
+            texts.add(self.get_lyrics_text(info, args))
+        return texts
+
+    def get_cache_config(self):
+        config = super().get_cache_config()
+        if not self.lyrics_embeddings is None:
+            config['lyrics_embeddings'] = [self.lyrics_embeddings.model_name, self.lyrics_embeddings.kind,
+                                           self.lyrics_tokens, "front-padded"]
+        return config
+
+    def get_audio_file(self, info):
+        return path.join(self.audio_dir, "{}.{}".format(
+            info[SONG_ID], self.audio_extension))
+
+    def get_lyrics(self, info, args):
+
+        if info['lyrics'] != 1:
+            return None
+
+        frame = args
+
+        song_start_time = info[SONG_START_TIME]
+        start_time = (song_start_time - 3) + (self.overlap * frame)
+        end_time = (song_start_time - 3) + (self.overlap * frame) + self.chunk_duration
+
+        return self.lyrics.get_lyrics_between(info[SONG_ID], start_time, end_time)
+
+    def get_lyrics_text(self, info, args):
+        x = self.get_lyrics(info, args)
+        return "" if x is None else x
+
+    def get_lyrics_embedding(self, info, args):
+        x = self.lyrics_embeddings.get(self.get_lyrics_text(info, args))
+        if not self.lyrics_tokens is None:
+            # padded at the front, the LSTM lyrics layers of the SEQUENCE
+            # models read their last step
+            out = torch.zeros(self.lyrics_tokens, x.shape[1], dtype=x.dtype)
+            out[self.lyrics_tokens - x.shape[0]:] = x
+            return out
+        if self.use_feature_cache():
+            # a view would pickle the whole memory map along with it
+            return x.clone()
+        return x
+
+    def get_features(self, info, args):
+        audio_x = self.get_chunk(info, args)
+
+        if self.lyrics_embeddings is None:
+            lyrics_x = self.get_lyrics(info, args)
+        else:
+            lyrics_x = self.get_lyrics_embedding(info, args)
+
+        return (audio_x, lyrics_x)
@@ -0,0 +1,83 @@
+import os
+import time
+
+import numpy as np
+from torch.utils.data import DataLoader
+
+
+def get_children_rss(pid=None):
+    """
+    resident set size in bytes of every direct child of `pid` (the loader
+    workers of this process) read from /proc
+    """
+    pid = os.getpid() if pid is None else pid
+    ret = {}
+    for p in os.listdir("/proc"):
+        if not p.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(p), mode="r") as f:
+                # the command name may hold spaces, the fields after it do not
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            if ppid != pid:
+                continue
+            with open("/proc/{}/status".format(p), mode="r") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        ret[int(p)] = int(line.split()[1]) * 1024
+        except (OSError, IndexError, ValueError):
+            continue
+    return ret
+
+
+def get_rss(pid=None):
+    pid = "self" if pid is None else pid
+    with open("/proc/{}/status".format(pid), mode="r") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def bench_loader(dataset, batch_size, num_workers, n_batches, collate_fn=None):
+    """
+    iterate `n_batches` of a DataLoader over `dataset` and measure it, the
+    first batch (worker start up) is reported on its own
+    """
+    dl = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers,
+                    drop_last=True, collate_fn=collate_fn)
+    latencies = []
+    samples = 0
+    start = time.perf_counter()
+    last = start
+    it = iter(dl)
+    for _ in range(n_batches):
+        try:
+            (X, y) = next(it)
+        except StopIteration:
+            break
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+        samples += len(y)
+    elapsed = time.perf_counter() - start
+    # sampled while the workers are still alive
+    workers_rss = get_children_rss()
+    del it
+
+    steady = np.array(latencies[1:] if len(latencies) > 1 else latencies, dtype=np.float64)
+    return {
+        'batch_size': batch_size,
+        'num_workers': num_workers,
+        'batches': len(latencies),
+        'samples': samples,
+        'elapsed_s': elapsed,
+        'samples_per_s': samples / max(elapsed, 1e-9),
+        'first_batch_s': latencies[0] if len(latencies) > 0 else None,
+        'latency_p50_ms': 1000 * float(np.percentile(steady, 50)) if len(steady) > 0 else None,
+        'latency_p90_ms': 1000 * float(np.percentile(steady, 90)) if len(steady) > 0 else None,
+        'latency_p99_ms': 1000 * float(np.percentile(steady, 99)) if len(steady) > 0 else None,
+        'main_rss_mb': get_rss() / (1024 * 1024),
+        'worker_rss_mb': [v / (1024 * 1024) for v in workers_rss.values()],
+        'worker_rss_total_mb': sum(workers_rss.values()) / (1024 * 1024),
+    }
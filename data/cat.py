@@ -1,37 +1,21 @@
 from os import path
 
-import torchaudio
-
 from data import *
 from data.base import BaseChunkedDataset
 
 class CatAudioDataset(BaseChunkedDataset):
 
-    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3"):
-        super().__init__(meta_file, temp_folder=temp_folder, force_compute=force_compute)
-
-        self.sr = sr
+    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3", **kwargs):
         self.data_dir = data_dir
-        self.chunk_duration = chunk_duration
-        self.overlap = overlap
         self.audio_extension = audio_extension
-        self.frame_count = int(self.sr * self.chunk_duration)
 
-    def get_audio(self, info, args):
-        audio_file = path.join(self.data_dir, "{}.{}".format(
-            info[SONG_ID], self.audio_extension))
-        meta_data = torchaudio.info(audio_file)
-        sr = meta_data.sample_rate
+        super().__init__(meta_file, sr=sr, chunk_duration=chunk_duration, overlap=overlap,
+                         temp_folder=temp_folder, force_compute=force_compute, **kwargs)
 
-        frame = args
-        offset = int(sr * ((self.overlap * frame) + info[START_TIME]))
-        frames = int(sr * self.chunk_duration)
-
-        x, sr = torchaudio.load(
-            audio_file, frame_offset=offset, num_frames=frames)
-        return (x, sr)
+    def get_audio_file(self, info):
+        return path.join(self.data_dir, "{}.{}".format(
+            info[SONG_ID], self.audio_extension))
 
     def get_features(self, info, args):
-        x, sr = self.get_audio(info, args)
-        x = preprocess_audio(self.frame_count, x, sr, self.sr)
+        x = self.get_chunk(info, args)
         return x
\ No newline at end of file
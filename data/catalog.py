@@ -0,0 +1,88 @@
+import hashlib
+import os
+import pickle
+from collections import namedtuple
+from os import path
+
+import torchaudio
+
+MediaInfo = namedtuple("MediaInfo", ["sample_rate", "num_channels", "num_frames", "codec"])
+
+
+def read_media_info(audio_file):
+    meta_data = torchaudio.info(audio_file)
+    # some backends report 0 frames for mp3 files, the duration is then
+    # unknown rather than scanning the whole file here
+    num_frames = meta_data.num_frames
+    codec = getattr(meta_data, "encoding", None)
+    if codec is None:
+        codec = path.splitext(audio_file)[1][1:].upper()
+    return MediaInfo(meta_data.sample_rate, meta_data.num_channels, num_frames, str(codec))
+
+
+class MediaCatalog:
+    """
+    sample rate, channels, frame count and codec of every audio file of a
+    dataset. the headers are read once, entries are cached per path and
+    only read again when the size or mtime of the file changed
+    """
+
+    def __init__(self, audio_files, cache_dir=None):
+        audio_files = sorted(set(audio_files))
+        self.entries = {}
+
+        cached = {}
+        cache_file = None
+        if not cache_dir is None:
+            h = hashlib.sha1("\n".join(path.abspath(f) for f in audio_files).encode("utf-8"))
+            cache_file = path.join(cache_dir, "catalog-{}.pkl".format(h.hexdigest()[:16]))
+            if path.exists(cache_file):
+                try:
+                    with open(cache_file, mode="rb") as f:
+                        cached = pickle.load(f)
+                except:
+                    print("Warning: failed to load media catalog. reading headers... {}".format(cache_file))
+
+        changed = False
+        for audio_file in audio_files:
+            if not path.exists(audio_file):
+                self.entries[audio_file] = (None, None)
+                changed = changed or cached.get(audio_file) != (None, None)
+                continue
+            st = os.stat(audio_file)
+            key = (st.st_size, st.st_mtime_ns)
+            entry = cached.get(audio_file)
+            if entry is None or entry[0] != key:
+                try:
+                    entry = (key, read_media_info(audio_file))
+                except Exception as e:
+                    print("Warning: could not read {} - {}".format(audio_file, e))
+                    entry = (key, None)
+                changed = True
+            self.entries[audio_file] = entry
+
+        if changed and not cache_file is None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(tmp_file, mode="wb") as f:
+                pickle.dump(self.entries, f)
+            os.replace(tmp_file, cache_file)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, audio_file):
+        return not self.get(audio_file) is None
+
+    def get(self, audio_file):
+        """
+        MediaInfo of `audio_file`, None if it is missing or unreadable
+        """
+        entry = self.entries.get(audio_file)
+        return None if entry is None else entry[1]
+
+    def get_duration(self, audio_file):
+        info = self.get(audio_file)
+        if info is None or info.num_frames <= 0:
+            return None
+        return info.num_frames / info.sample_rate
@@ -0,0 +1,90 @@
+import hashlib
+
+import torch
+
+from data.store import SongArrayStore
+
+BERT_MODEL = 'bert-base-uncased'
+BERT_HIDDEN_SIZE = 768
+
+POOLED = "pooled"
+SEQUENCE = "sequence"
+
+
+def text_key(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class LyricsEmbeddingStore:
+    """
+    frozen BERT outputs for every unique lyrics window, keyed by the hash of
+    the text and kept in a memory-mapped SongArrayStore per (model, kind).
+
+    kind "pooled" stores the pooled output (1, hidden) of each text, kind
+    "sequence" stores the last hidden state of every token (tokens, hidden)
+    """
+
+    def __init__(self, root, model_name=BERT_MODEL, kind=POOLED, hidden_size=BERT_HIDDEN_SIZE, dtype="float32"):
+        if not kind in [POOLED, SEQUENCE]:
+            raise Exception("Unknown embedding kind {}".format(kind))
+        self.model_name = model_name
+        self.kind = kind
+        name = "{}-{}".format(model_name.replace("/", "_"), kind)
+        if dtype != "float32":
+            name = "{}-{}".format(name, dtype)
+        self.store = SongArrayStore(root, name, dtype=dtype, row_shape=(hidden_size,))
+
+    def __contains__(self, text):
+        return text_key(text) in self.store
+
+    def get(self, text):
+        x = self.store.get(text_key(text))
+        if x is None:
+            raise KeyError("No embedding for lyrics {}".format(repr(text)))
+        if self.kind == POOLED:
+            return x[0]
+        return x
+
+    def get_length(self, text):
+        (_, length) = self.store.index[text_key(text)]
+        return length
+
+    def compute(self, texts, batch_size=32, device=None):
+        """
+        run the frozen model over the texts that are not stored yet
+        """
+        self.store.refresh()
+        texts = sorted(set(t for t in texts if not t in self))
+        if len(texts) == 0:
+            return 0
+
+        from transformers import BertTokenizer, BertModel
+
+        if device is None:
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+
+        print("Computing {} {} embeddings for {} lyrics windows...".format(
+            self.model_name, self.kind, len(texts)))
+        tokenizer = BertTokenizer.from_pretrained(self.model_name)
+        model = BertModel.from_pretrained(self.model_name).to(device)
+        model.eval()
+
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            tokens = tokenizer(batch, padding=True, truncation=False, return_tensors="pt",
+                               return_token_type_ids=False, return_attention_mask=True)
+            input_ids = tokens['input_ids'].to(device)
+            attention_mask = tokens['attention_mask'].to(device)
+            with torch.no_grad():
+                out = model(input_ids, attention_mask=attention_mask)
+            if self.kind == POOLED:
+                x = out[1].cpu()
+                items = [(text_key(t), x[j:j + 1]) for (j, t) in enumerate(batch)]
+            else:
+                x = out[0].cpu()
+                lengths = attention_mask.sum(dim=1).cpu()
+                items = [(text_key(t), x[j, :lengths[j]]) for (j, t) in enumerate(batch)]
+            self.store.put_many(items)
+
+        self.store.compact()
+        return len(texts)
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import pickle
+from os import path
+
+import numpy as np
+import pylrc
+
+
+class LyricsIndex:
+    """
+    every .lrc file of a dataset parsed once, each song's lines kept as a
+    sorted array of start times plus the matching texts so the lyrics of any
+    [start, end) window are found with two binary searches
+    """
+
+    def __init__(self, lyrics_dir, song_ids, cache_dir=None):
+        self.lyrics_dir = lyrics_dir
+        self.songs = {}
+
+        song_ids = sorted(set(str(s) for s in song_ids))
+        cache_file = None
+        if not cache_dir is None:
+            cache_file = path.join(cache_dir, "lyrics-{}.pkl".format(self.__get_hash(song_ids)))
+            if path.exists(cache_file):
+                try:
+                    with open(cache_file, mode="rb") as f:
+                        self.songs = pickle.load(f)
+                    return
+                except:
+                    print("Warning: failed to load lyrics index. parsing lyrics... {}".format(cache_file))
+
+        for song_id in song_ids:
+            self.songs[song_id] = self.__parse(song_id)
+
+        if not cache_file is None:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+            with open(tmp_file, mode="wb") as f:
+                pickle.dump(self.songs, f)
+            os.replace(tmp_file, cache_file)
+
+    def get_lyrics_file(self, song_id):
+        return path.join(self.lyrics_dir, "{}.lrc".format(song_id))
+
+    def __get_hash(self, song_ids):
+        # the index is rebuilt whenever one of the .lrc files changes
+        h = hashlib.sha1(path.abspath(self.lyrics_dir).encode("utf-8"))
+        for song_id in song_ids:
+            lyrics_file = self.get_lyrics_file(song_id)
+            st = os.stat(lyrics_file) if path.exists(lyrics_file) else None
+            h.update("{}:{}:{}\n".format(song_id,
+                     None if st is None else st.st_size,
+                     None if st is None else st.st_mtime_ns).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    def __parse(self, song_id):
+        lyrics_file = self.get_lyrics_file(song_id)
+        times = np.zeros(0, dtype=np.float64)
+        texts = np.zeros(0, dtype=str)
+        try:
+            with open(lyrics_file, mode='r') as f:
+                lrc_string = ''.join(f.readlines())
+            subs = pylrc.parse(lrc_string)
+            times = np.array([x.time for x in subs], dtype=np.float64)
+            order = np.argsort(times, kind="stable")
+            times = times[order]
+            texts = np.array([subs[i].text for i in order], dtype=str)
+        except Exception as e:
+            print(e)
+            print(lyrics_file)
+        return (times, texts)
+
+    def __contains__(self, song_id):
+        return str(song_id) in self.songs
+
+    def get_lyrics_between(self, song_id, start_time, end_time):
+        # a line is in the window when its start time is in [start_time, end_time)
+        (times, texts) = self.songs[str(song_id)]
+        start = np.searchsorted(times, start_time, side="left")
+        end = np.searchsorted(times, end_time, side="left")
+        return " ".join(texts[start:end])
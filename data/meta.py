@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+
+class MetaRecord:
+    """
+    lightweight view of one metadata row, replaces the pandas Series that
+    used to be handed out per item
+    """
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.table.get(self.index, key)
+
+    def __contains__(self, key):
+        return key in self.table
+
+    def get_values(self, keys, dtype=np.float64):
+        return np.array([self.table.get(self.index, k) for k in keys], dtype=dtype)
+
+
+class MetaTable:
+    """
+    struct-of-arrays copy of the split metadata
+
+    scalar columns are plain numpy arrays (strings become fixed-width unicode
+    arrays) and list columns (dynamic annotations) are stored as one flat
+    float32 buffer plus offsets. nothing here is a python object, so forked
+    DataLoader workers do not touch refcounts and keep sharing the pages.
+    """
+
+    def __init__(self, columns, ragged):
+        self.columns = columns
+        self.ragged = ragged
+        self.count = 0
+        for c in columns.values():
+            self.count = len(c)
+            break
+        for (_, offsets) in ragged.values():
+            self.count = len(offsets) - 1
+            break
+
+    @classmethod
+    def from_frame(cls, df):
+        columns = {}
+        ragged = {}
+        for name in df.columns:
+            col = df[name]
+            if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+                columns[name] = col.to_numpy()
+                continue
+            first = next((x for x in col if isinstance(x, (list, tuple, np.ndarray))), None)
+            if first is None:
+                columns[name] = col.astype(str).to_numpy(dtype=str)
+                continue
+            rows = [np.asarray(x if isinstance(x, (list, tuple, np.ndarray)) else [], dtype=np.float32) for x in col]
+            offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(x) for x in rows])
+            values = np.concatenate(rows) if len(rows) > 0 else np.zeros(0, dtype=np.float32)
+            ragged[name] = (values.astype(np.float32), offsets)
+        return cls(columns, ragged)
+
+    def save(self, file):
+        """
+        write all columns to an .npz, ragged columns as values + offsets
+        """
+        arrays = {}
+        for (name, x) in self.columns.items():
+            arrays["col:{}".format(name)] = x
+        for (name, (values, offsets)) in self.ragged.items():
+            arrays["ragged:{}:values".format(name)] = values
+            arrays["ragged:{}:offsets".format(name)] = offsets
+        np.savez(file, **arrays)
+
+    @classmethod
+    def load(cls, file):
+        columns = {}
+        ragged = {}
+        with np.load(file, allow_pickle=False) as d:
+            for key in d.files:
+                kind, rest = key.split(":", 1)
+                if kind == "col":
+                    columns[rest] = d[key]
+                elif rest.endswith(":values"):
+                    name = rest[:-len(":values")]
+                    ragged[name] = (d[key], d["ragged:{}:offsets".format(name)])
+        return cls(columns, ragged)
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return key in self.columns or key in self.ragged
+
+    def __getitem__(self, key):
+        """
+        whole column, ragged columns come back as (values, offsets)
+        """
+        if key in self.columns:
+            return self.columns[key]
+        return self.ragged[key]
+
+    def get(self, index, key):
+        if key in self.columns:
+            return self.columns[key][index]
+        (values, offsets) = self.ragged[key]
+        return values[offsets[index]:offsets[index + 1]]
+
+    def record(self, index):
+        return MetaRecord(self, index)
+
+
+class PrefixSums:
+    """
+    per-row float32 prefix sums over several ragged columns that share the
+    same lengths (e.g. the four dynamic annotation series), so the mean over
+    any window of a row is a constant-time difference
+    """
+
+    def __init__(self, table, keys):
+        (_, offsets) = table[keys[0]]
+        for k in keys[1:]:
+            if not np.array_equal(table[k][1], offsets):
+                raise Exception("Columns {} do not have matching lengths".format(keys))
+        self.keys = keys
+        self.lengths = np.diff(offsets)
+        # every row gets a leading zero, so row i starts at offsets[i] + i
+        self.starts = offsets[:-1] + np.arange(len(self.lengths), dtype=np.int64)
+
+        values = np.stack([table[k][0] for k in keys], axis=1).astype(np.float64)
+        rows = np.repeat(np.arange(len(self.lengths)), self.lengths)
+        cumsum = np.cumsum(values, axis=0)
+        before_row = np.concatenate([np.zeros((1, len(keys))), cumsum])[offsets[:-1]]
+        # accumulate in float64 and restart at every row before going to float32
+        sums = np.zeros((len(values) + len(self.lengths), len(keys)), dtype=np.float64)
+        sums[np.arange(len(values)) + rows + 1] = cumsum - before_row[rows]
+        self.sums = sums.astype(np.float32)
+
+    def window_mean(self, index, start, end):
+        """
+        mean of every column over values [start, end) of row `index`, with
+        python slice clipping; None when the window is empty
+        """
+        length = self.lengths[index]
+        start = min(max(start, 0), length)
+        end = min(max(end, 0), length)
+        if end <= start:
+            return None
+        base = self.starts[index]
+        return (self.sums[base + end] - self.sums[base + start]) / (end - start)
@@ -0,0 +1,224 @@
+import hashlib
+import io
+import os
+from os import path
+
+import numpy as np
+import torchaudio
+
+# frames decoded before the requested one so that the bit reservoir
+# (main data of a frame can start up to 511 bytes into earlier frames) and
+# the synthesis filterbank are filled again
+WARMUP_FRAMES = 4
+
+# bump when the sidecar index files change
+INDEX_VERSION = 2
+
+# decoder delay that ffmpeg adds to the encoder delay of the LAME tag
+DECODER_DELAY = 529
+
+_BITRATES = {
+    # (mpeg1, layer) -> kbps by bitrate index
+    (True, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (True, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (True, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (False, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (False, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (False, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def parse_header(b):
+    """
+    (frame length in bytes, samples per frame, sample rate, channels) of the
+    4 byte frame header `b`, None if it is not a valid header
+    """
+    if b[0] != 0xFF or (b[1] & 0xE0) != 0xE0:
+        return None
+    version = (b[1] >> 3) & 0x3
+    layer = 4 - ((b[1] >> 1) & 0x3)
+    bitrate_index = b[2] >> 4
+    sr_index = (b[2] >> 2) & 0x3
+    if version == 1 or layer == 4 or bitrate_index in [0, 15] or sr_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sr = _SAMPLE_RATES[version][sr_index]
+    padding = (b[2] >> 1) & 0x1
+    channels = 1 if (b[3] >> 6) == 3 else 2
+
+    if layer == 1:
+        return ((12 * bitrate // sr + padding) * 4, 384, sr, channels)
+    if layer == 3 and not mpeg1:
+        return (72 * bitrate // sr + padding, 576, sr, channels)
+    return (144 * bitrate // sr + padding, 1152, sr, channels)
+
+
+def skip_id3(data):
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for c in data[6:10]:
+        size = (size << 7) | (c & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def get_encoder_padding(frame):
+    """
+    (encoder delay, end padding) of the LAME tag in the Xing/Info `frame`,
+    it follows the optional Xing fields whatever the encoder string is
+    ("LAME", "Lavc", ...)
+    """
+    xing = max(frame.find(b"Xing", 0, 64), frame.find(b"Info", 0, 64))
+    if xing < 0 or xing + 8 > len(frame):
+        return (0, 0)
+    flags = int.from_bytes(frame[xing + 4:xing + 8], "big")
+    lame = xing + 8
+    # frame count, byte count, TOC and quality
+    for (flag, size) in [(1, 4), (2, 4), (4, 100), (8, 4)]:
+        if flags & flag:
+            lame += size
+    if lame + 24 > len(frame):
+        return (0, 0)
+    d = frame[lame + 21:lame + 24]
+    return ((d[0] << 4) | (d[1] >> 4), ((d[1] & 0xF) << 8) | d[2])
+
+
+class Mp3SeekIndex:
+    """
+    byte offset of every audio frame of an mp3 file, the sample position of
+    a frame is its index times the samples per frame. the Xing/Info frame is
+    left out and the LAME encoder delay is kept so that positions line up
+    with what torchaudio returns for the whole file
+    """
+
+    def __init__(self, offsets, samples_per_frame, sr, channels, skip, trailing, size):
+        self.offsets = offsets
+        self.samples_per_frame = samples_per_frame
+        self.sr = sr
+        self.channels = channels
+        self.skip = skip
+        self.trailing = trailing
+        self.size = size
+
+    @staticmethod
+    def build(audio_file):
+        with open(audio_file, mode="rb") as f:
+            data = f.read()
+
+        pos = skip_id3(data)
+        offsets = []
+        header = None
+        skip = 0
+        trailing = 0
+        while pos + 4 <= len(data):
+            h = parse_header(data[pos:pos + 4])
+            if h is None or h[0] <= 4:
+                # resync, e.g. junk between tags and the first frame
+                pos += 1
+                continue
+            if header is None:
+                header = h
+                # Xing/Info/VBRI tag frames carry no audio
+                first = data[pos:pos + h[0]]
+                if any(first.find(t, 0, 64) >= 0 for t in [b"Xing", b"Info", b"VBRI"]):
+                    (delay, padding) = get_encoder_padding(first)
+                    skip = delay + DECODER_DELAY
+                    # the decoder delay is taken from the end padding
+                    trailing = max(0, padding - DECODER_DELAY)
+                    pos += h[0]
+                    continue
+            elif h[1:3] != header[1:3]:
+                raise Exception("Mixed mp3 frame formats in {}".format(audio_file))
+            offsets.append(pos)
+            pos += h[0]
+
+        if header is None:
+            raise Exception("No mp3 frames found in {}".format(audio_file))
+        return Mp3SeekIndex(np.asarray(offsets, dtype=np.int64), header[1], header[2], header[3], skip, trailing, len(data))
+
+    @property
+    def num_frames(self):
+        return max(0, len(self.offsets) * self.samples_per_frame - self.skip - self.trailing)
+
+    def load(self, audio_file, frame_offset=0, num_frames=-1):
+        """
+        same as torchaudio.load(audio_file, frame_offset, num_frames) but only
+        the mp3 frames that overlap the range (plus warm-up) are decoded
+        """
+        if num_frames < 0 or frame_offset + num_frames > self.num_frames:
+            num_frames = max(0, self.num_frames - frame_offset)
+        start = frame_offset + self.skip
+        end = start + num_frames
+        first = max(0, start // self.samples_per_frame - WARMUP_FRAMES)
+        last = min(len(self.offsets), -(-end // self.samples_per_frame) + 1)
+        if first >= last:
+            x, sr = torchaudio.load(audio_file, frame_offset=frame_offset, num_frames=num_frames)
+            return (x, sr)
+
+        byte_start = self.offsets[first]
+        byte_end = self.offsets[last] if last < len(self.offsets) else self.size
+        with open(audio_file, mode="rb") as f:
+            f.seek(byte_start)
+            data = f.read(byte_end - byte_start)
+        x, sr = torchaudio.load(io.BytesIO(data), format="mp3")
+        begin = start - first * self.samples_per_frame
+        return (x[:, begin:begin + num_frames], sr)
+
+    def to_dict(self):
+        return {
+            'offsets': self.offsets,
+            'meta': np.array([self.samples_per_frame, self.sr, self.channels, self.skip, self.trailing, self.size], dtype=np.int64)
+        }
+
+    @staticmethod
+    def from_dict(d):
+        (spf, sr, channels, skip, trailing, size) = [int(v) for v in d['meta']]
+        return Mp3SeekIndex(d['offsets'], spf, sr, channels, skip, trailing, size)
+
+
+class Mp3IndexCache:
+    """
+    seek indices kept in memory and as sidecar .npz files in `cache_dir`,
+    keyed by path, size and mtime of the mp3 so a changed file is indexed again
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.indices = {}
+
+    def get_cache_file(self, audio_file):
+        st = os.stat(audio_file)
+        key = "{}:{}:{}:{}".format(INDEX_VERSION, path.abspath(audio_file), st.st_size, st.st_mtime_ns)
+        return path.join(self.cache_dir, "{}.npz".format(hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]))
+
+    def get(self, audio_file):
+        """
+        seek index of `audio_file`, None if it can not be indexed
+        """
+        if audio_file in self.indices:
+            return self.indices[audio_file]
+
+        index = None
+        cache_file = self.get_cache_file(audio_file)
+        if path.exists(cache_file):
+            try:
+                with np.load(cache_file) as d:
+                    index = Mp3SeekIndex.from_dict(d)
+            except:
+                print("Warning: failed to load mp3 index. indexing... {}".format(cache_file))
+        if index is None:
+            try:
+                index = Mp3SeekIndex.build(audio_file)
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+                with open(tmp_file, mode="wb") as f:
+                    np.savez(f, **index.to_dict())
+                os.replace(tmp_file, cache_file)
+            except Exception as e:
+                print("Warning: {}".format(e))
+
+        self.indices[audio_file] = index
+        return index
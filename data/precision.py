@@ -0,0 +1,49 @@
+import torch
+
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT16 = "int16"
+
+WAVEFORM_DTYPES = [FLOAT32, FLOAT16, INT16]
+FEATURE_DTYPES = [FLOAT32, FLOAT16]
+
+PCM_SCALE = 32767.0
+
+
+def check_dtype(dtype, allowed):
+    if not dtype in allowed:
+        raise Exception("Unknown storage dtype {}, expected one of {}".format(dtype, allowed))
+    return dtype
+
+
+def to_storage(x, dtype):
+    """
+    convert float tensors (also inside tuples/lists) to the storage dtype,
+    int16 is treated as PCM so values are clipped to [-1, 1] and scaled
+    """
+    if isinstance(x, (tuple, list)):
+        return type(x)(to_storage(v, dtype) for v in x)
+    if not torch.is_tensor(x) or not x.is_floating_point():
+        return x
+    if dtype == FLOAT16:
+        return x.half()
+    if dtype == INT16:
+        return torch.round(torch.clamp(x, -1.0, 1.0) * PCM_SCALE).to(torch.int16)
+    return x
+
+
+def to_float32(x):
+    """
+    inverse of to_storage, anything that is not int16/float16 is returned as is
+    """
+    if isinstance(x, (tuple, list)):
+        return type(x)(to_float32(v) for v in x)
+    if isinstance(x, dict):
+        return {k: to_float32(v) for (k, v) in x.items()}
+    if not torch.is_tensor(x):
+        return x
+    if x.dtype == torch.int16:
+        return x.float() / PCM_SCALE
+    if x.dtype == torch.float16:
+        return x.float()
+    return x
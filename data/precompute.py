@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from multiprocessing import Pool
+
+from data import profile
+
+_dataset = None
+
+
+def _init_worker(dataset, shared):
+    global _dataset
+    _dataset = dataset
+    profile.init_process(shared)
+
+
+def _precompute_indices(indices):
+    for index in indices:
+        _dataset.precompute(index)
+    return len(indices)
+
+
+def group_by_song(dataset, indices):
+    """
+    group dataset indices by song so that a worker decodes each song once and
+    serves the rest of its chunks from its song cache
+    """
+    groups = OrderedDict()
+    for index in indices:
+        groups.setdefault(dataset.get_song_index(index), []).append(index)
+    return list(groups.values())
+
+
+def pending_indices(dataset):
+    return [i for i in range(len(dataset)) if not dataset.is_cached(i)]
+
+
+def precompute_dataset(dataset, num_workers=1, log_interval=10.0):
+    """
+    fill the feature cache of `dataset` with a pool of `num_workers`
+    processes, entries that are already cached are skipped so an interrupted
+    run can simply be started again
+    """
+    total = len(dataset)
+    indices = pending_indices(dataset)
+    skipped = total - len(indices)
+    print("Precompute: {} items, {} already cached, {} to compute".format(total, skipped, len(indices)))
+    if len(indices) == 0:
+        return 0
+
+    groups = group_by_song(dataset, indices)
+
+    done = 0
+    start = time.time()
+    last_log = start
+    with Pool(processes=num_workers, initializer=_init_worker, initargs=(dataset, profile.get_shared())) as pool:
+        for n in pool.imap_unordered(_precompute_indices, groups):
+            done += n
+            now = time.time()
+            if now - last_log >= log_interval or done == len(indices):
+                rate = done / max(now - start, 1e-6)
+                eta = (len(indices) - done) / max(rate, 1e-6)
+                print("Precompute: {}/{} ({:.1f}%) {:.1f} items/s ETA {:.0f}s".format(
+                    done, len(indices), 100 * done / len(indices), rate, eta))
+                last_log = now
+
+    dataset.compact_stores()
+
+    elapsed = time.time() - start
+    print("Precompute: done {} items in {:.1f}s ({:.1f} items/s)".format(
+        done, elapsed, done / max(elapsed, 1e-6)))
+    return done
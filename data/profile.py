@@ -0,0 +1,189 @@
+import os
+import time
+from multiprocessing import Array, Value, cpu_count
+
+from torch.utils.data import get_worker_info
+
+# (stage, dataset method that is timed)
+STAGES = [
+    ("item", "get_item"),
+    ("meta", "get_info"),
+    ("features", "get_features"),
+    ("audio", "get_audio"),
+    ("decode", "decode_song"),
+    ("lyrics", "get_lyrics"),
+    ("label", "get_label"),
+    ("cache_read", "read_cache_entry"),
+    ("cache_write", "write_cache_entry"),
+]
+CACHE_HIT = "cache_hit"
+CACHE_MISS = "cache_miss"
+COUNTERS = [CACHE_HIT, CACHE_MISS]
+
+# the shared arrays are kept out of the profiler (and so out of the pickled
+# datasets): {profiler id: Array}, set in the process that created the
+# profilers, inherited by forked processes and handed to spawned ones with
+# init_process()
+_values = {}
+# number of pool processes that took a row so far, see init_process
+_pool_count = None
+# (pid, pool row index) of a pool process
+_pool_row = None
+
+
+def get_shared():
+    return (_values, _pool_count)
+
+
+def init_process(shared, pool=True):
+    """
+    set the shared arrays in a new process, a pool process (precompute,
+    cache warmer) also takes a row of its own
+    """
+    global _values, _pool_count, _pool_row
+    (_values, _pool_count) = shared
+    if pool and not _pool_count is None:
+        with _pool_count.get_lock():
+            _pool_row = (os.getpid(), _pool_count.value)
+            _pool_count.value += 1
+
+
+def get_worker_init_fn():
+    """
+    worker_init_fn of a DataLoader so that spawned workers get the arrays,
+    None when nothing is profiled
+    """
+    if len(_values) == 0:
+        return None
+    return _WorkerInit(get_shared())
+
+
+class _WorkerInit:
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    def __call__(self, worker_id):
+        init_process(self.shared, pool=False)
+
+
+class DataProfiler:
+    """
+    per-stage timings and cache hit/miss counts of a dataset
+
+    enable() replaces the dataset's stage methods on the instance with timed
+    wrappers, so a dataset without profiler runs the plain methods. values
+    live in a shared array with one row per process: the main process, each
+    DataLoader worker and each pool process (precompute, cache warmer). each
+    process only writes its own row, so no locks are needed
+    """
+
+    def __init__(self, max_workers=None, max_processes=None):
+        global _pool_count
+        self.max_workers = cpu_count() if max_workers is None else max_workers
+        self.max_processes = cpu_count() if max_processes is None else max_processes
+        self.names = [s for (s, _) in STAGES]
+        # per stage: total seconds and calls, then the counters
+        self.width = 2 * len(self.names) + len(COUNTERS)
+        self.rows = 1 + self.max_workers + self.max_processes
+        self.id = "{}-{}".format(os.getpid(), len(_values))
+        _values[self.id] = Array("d", self.rows * self.width, lock=False)
+        if _pool_count is None:
+            _pool_count = Value("i", 0)
+        # (pid, row), a forked worker must not reuse the parent's row
+        self.row = None
+
+    @property
+    def values(self):
+        if not self.id in _values:
+            raise Exception("Profiler arrays are not set in process {}, pass data.profile.get_worker_init_fn() to the loader".format(os.getpid()))
+        return _values[self.id]
+
+    def __get_row(self):
+        pid = os.getpid()
+        if self.row is None or self.row[0] != pid:
+            worker = get_worker_info()
+            if not _pool_row is None and _pool_row[0] == pid:
+                row = 1 + self.max_workers + (_pool_row[1] % self.max_processes)
+            elif not worker is None:
+                row = 1 + (worker.id % self.max_workers)
+            else:
+                row = 0
+            self.row = (pid, row)
+        return self.row[1] * self.width
+
+    def add(self, stage, seconds):
+        values = self.values
+        i = self.__get_row() + 2 * self.names.index(stage)
+        values[i] += seconds
+        values[i + 1] += 1
+
+    def count(self, counter, n=1):
+        self.values[self.__get_row() + 2 * len(self.names) + COUNTERS.index(counter)] += n
+
+    def wrap(self, stage, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            ret = fn(*args, **kwargs)
+            self.add(stage, time.perf_counter() - start)
+            return ret
+        return timed
+
+    def wrap_cache_read(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            ret = fn(*args, **kwargs)
+            self.add("cache_read", time.perf_counter() - start)
+            self.count(CACHE_MISS if ret is None else CACHE_HIT)
+            return ret
+        return timed
+
+    def enable(self, dataset):
+        for (stage, method) in STAGES:
+            fn = getattr(dataset, method, None)
+            if fn is None:
+                continue
+            if method == "read_cache_entry":
+                setattr(dataset, method, self.wrap_cache_read(fn))
+            else:
+                setattr(dataset, method, self.wrap(stage, fn))
+        dataset.profiler = self
+
+    def get_dataset_state(self, state):
+        """
+        pickle state of a profiled dataset without the wrappers (closures),
+        enable() sets them up again after unpickling
+        """
+        state = dict(state)
+        for (_, method) in STAGES:
+            state.pop(method, None)
+        return state
+
+    def reset(self):
+        values = self.values
+        for i in range(len(values)):
+            values[i] = 0.0
+
+    def summary(self):
+        """
+        {"<stage>_ms": mean milliseconds per call, "<stage>_calls", counters
+        and the cache hit rate} summed over all processes
+        """
+        values = self.values
+        totals = [0.0] * self.width
+        for r in range(self.rows):
+            for i in range(self.width):
+                totals[i] += values[r * self.width + i]
+        ret = {}
+        for (i, stage) in enumerate(self.names):
+            (seconds, calls) = (totals[2 * i], totals[2 * i + 1])
+            if calls == 0:
+                continue
+            ret["{}_ms".format(stage)] = 1000 * seconds / calls
+            ret["{}_calls".format(stage)] = calls
+        for (i, counter) in enumerate(COUNTERS):
+            ret[counter] = totals[2 * len(self.names) + i]
+        lookups = ret[CACHE_HIT] + ret[CACHE_MISS]
+        if lookups > 0:
+            ret["cache_hit_rate"] = ret[CACHE_HIT] / lookups
+        return ret
@@ -0,0 +1,106 @@
+import torch
+import torchaudio
+from torch.utils.data import Subset
+from torch.utils.data.dataloader import default_collate
+
+from data.resident import flatten, unflatten
+
+# longer sinc kernels than the torchaudio default (width 6) for a steeper
+# transition band, and the cutoff lowered from 0.99 to 0.9 of the Nyquist
+# rate so that less aliasing leaks through, like the sox "rate" effect that
+# was used before
+LOWPASS_FILTER_WIDTH = 16
+ROLLOFF = 0.9
+
+_resamplers = {}
+
+
+def get_resampler_config():
+    """
+    parameters of the resampler, part of the cache config of the datasets
+    since they change every decoded waveform
+    """
+    return {
+        'method': "torchaudio-sinc",
+        'lowpass_filter_width': LOWPASS_FILTER_WIDTH,
+        'rolloff': ROLLOFF
+    }
+
+
+def get_resampler(orig_sr, new_sr):
+    """
+    Resample transform for (orig_sr, new_sr), its polyphase kernel is built
+    once per process and reused for every later call
+    """
+    key = (int(orig_sr), int(new_sr))
+    if not key in _resamplers:
+        _resamplers[key] = torchaudio.transforms.Resample(
+            key[0], key[1], lowpass_filter_width=LOWPASS_FILTER_WIDTH, rolloff=ROLLOFF)
+    return _resamplers[key]
+
+
+def resample(x, orig_sr, new_sr):
+    """
+    resample the last dimension of `x`, leading dimensions (channels, batch)
+    are done in the same vectorized call
+    """
+    if orig_sr == new_sr:
+        return x
+    with torch.no_grad():
+        return get_resampler(orig_sr, new_sr)(x)
+
+
+class DeferredAudio:
+    """
+    mono chunk still at the sample rate of the file, resampled together with
+    the rest of the batch by ResampleCollate
+    """
+
+    def __init__(self, x, sr):
+        self.x = x
+        self.sr = sr
+
+
+class ResampleCollate:
+    """
+    collate that resamples all DeferredAudio leaves of a batch, grouped by
+    sample rate, then crops/pads them to frame_count and uses default_collate
+    """
+
+    def __init__(self, sr, frame_count):
+        self.sr = sr
+        self.frame_count = frame_count
+
+    def resolve(self, chunks):
+        out = torch.zeros(len(chunks), 1, self.frame_count)
+        for sr in set(c.sr for c in chunks):
+            rows = [i for (i, c) in enumerate(chunks) if c.sr == sr]
+            n = max(chunks[i].x.shape[-1] for i in rows)
+            x = torch.zeros(len(rows), 1, n)
+            for (j, i) in enumerate(rows):
+                x[j, :, :chunks[i].x.shape[-1]] = chunks[i].x
+            x = resample(x, sr, self.sr)[:, :, :self.frame_count]
+            out[rows, :, :x.shape[-1]] = x
+        return out
+
+    def __call__(self, batch):
+        flat = [flatten(item) for item in batch]
+        spec = flat[0][1]
+        leaves = [l for (l, _) in flat]
+        for i in range(len(leaves[0])):
+            if isinstance(leaves[0][i], DeferredAudio):
+                x = self.resolve([l[i] for l in leaves])
+                for (j, l) in enumerate(leaves):
+                    l[i] = x[j]
+        return default_collate([unflatten(spec, l)[0] for l in leaves])
+
+
+def get_collate_fn(dataset):
+    """
+    collate_fn a dataset (or a Subset of it) asks for, None for the default
+    """
+    while isinstance(dataset, Subset):
+        dataset = dataset.dataset
+    if hasattr(dataset, "get_collate_fn"):
+        return dataset.get_collate_fn()
+    return None
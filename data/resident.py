@@ -0,0 +1,118 @@
+import torch
+from torch.utils.data import Dataset, DataLoader
+
+
+def flatten(x):
+    """
+    split a (nested) item into its leaves and a spec to rebuild it
+    """
+    if isinstance(x, (tuple, list)):
+        leaves = []
+        specs = []
+        for v in x:
+            (l, s) = flatten(v)
+            leaves += l
+            specs.append(s)
+        return (leaves, (type(x), specs))
+    if isinstance(x, dict):
+        (leaves, spec) = flatten(list(x.values()))
+        return (leaves, (dict, (list(x.keys()), spec)))
+    return ([x], None)
+
+
+def unflatten(spec, leaves, offset=0):
+    if spec is None:
+        return (leaves[offset], offset + 1)
+    (t, specs) = spec
+    if t is dict:
+        (keys, spec) = specs
+        (values, offset) = unflatten(spec, leaves, offset)
+        return (dict(zip(keys, values)), offset)
+    values = []
+    for s in specs:
+        (v, offset) = unflatten(s, leaves, offset)
+        values.append(v)
+    return (t(values), offset)
+
+
+# items per batch of the loader workers, every batch a worker sends holds a
+# shared memory file descriptor until it is copied into the blocks
+RESIDENT_BATCH_SIZE = 64
+
+
+def _stack(items):
+    """
+    (spec, columns) of a batch of items, tensor leaves stacked
+    """
+    spec = None
+    columns = None
+    for item in items:
+        (leaves, spec) = flatten(item)
+        if columns is None:
+            columns = [[] for _ in leaves]
+        for (c, v) in zip(columns, leaves):
+            c.append(v)
+    for (i, c) in enumerate(columns):
+        if torch.is_tensor(c[0]):
+            try:
+                columns[i] = torch.stack(c)
+            except RuntimeError:
+                raise Exception("Resident dataset needs items of equal shape, leaf {} differs".format(i))
+    return (spec, columns)
+
+
+class ResidentDataset(Dataset):
+    """
+    the whole dataset held in shared memory
+
+    every item is read once (from the feature cache when it is precomputed),
+    tensors with the same position in each item are copied into one block
+    in shared memory. DataLoader workers, also the ones of every k-fold
+    split, then read slices of the same pages instead of unpickling their
+    own copies. non tensor leaves (e.g. lyrics text) are kept as lists.
+    """
+
+    def __init__(self, dataset, num_workers=0, batch_size=RESIDENT_BATCH_SIZE):
+        self.dataset = dataset
+        self.spec = None
+        self.blocks = []
+
+        # the workers send stacked batches which are copied into blocks
+        # allocated once, so every received batch is released right away
+        loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers, collate_fn=_stack)
+        offset = 0
+        for (spec, columns) in loader:
+            if self.spec is None:
+                self.spec = spec
+                for c in columns:
+                    if torch.is_tensor(c):
+                        block = torch.empty((len(dataset), *c.shape[1:]), dtype=c.dtype)
+                        block.share_memory_()
+                    else:
+                        block = []
+                    self.blocks.append(block)
+            for (i, (block, c)) in enumerate(zip(self.blocks, columns)):
+                if not torch.is_tensor(block):
+                    block.extend(c)
+                elif c.shape[1:] != block.shape[1:] or c.dtype != block.dtype:
+                    raise Exception("Resident dataset needs items of equal shape, leaf {} differs".format(i))
+                else:
+                    block[offset:offset + c.shape[0]] = c
+            offset += len(columns[0])
+            del columns
+
+        n_bytes = sum(b.numel() * b.element_size() for b in self.blocks if torch.is_tensor(b))
+        print("Resident dataset: {} items, {:.1f} MB shared".format(len(self), n_bytes / (1024 * 1024)))
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getattr__(self, name):
+        # get_labels, frames, ... of the wrapped dataset
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __getitem__(self, index):
+        (item, _) = unflatten(self.spec, [b[index] for b in self.blocks])
+        return item
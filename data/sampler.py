@@ -0,0 +1,105 @@
+import numpy as np
+from torch.utils.data import Sampler, Subset
+
+SONG_WINDOW = 256
+
+
+def get_song_index(dataset):
+    """
+    song (meta row) of every dataset index from the chunk `frames`, also for
+    a Subset of a chunked dataset. None if the dataset is not chunked
+    """
+    indices = None
+    while isinstance(dataset, Subset):
+        sub = np.asarray(dataset.indices, dtype=np.int64)
+        indices = sub if indices is None else sub[indices]
+        dataset = dataset.dataset
+    frames = getattr(dataset, "frames", None)
+    if frames is None:
+        return None
+    songs = np.asarray(frames)[:, 0]
+    return songs if indices is None else songs[indices]
+
+
+class SongBatchSampler(Sampler):
+    """
+    batch sampler that keeps the chunks of a song on one DataLoader worker
+
+    songs are shuffled and dealt to `num_workers` streams (always to the
+    shortest one so the streams stay balanced), chunks are shuffled inside
+    windows of `window` items of a stream and the batches of the streams are
+    interleaved round robin, the same order the DataLoader hands batches to
+    its workers. a worker therefore sees few distinct songs at a time and its
+    song cache keeps hitting.
+    """
+
+    def __init__(self, song_index, batch_size, num_workers=0, window=SONG_WINDOW, drop_last=True, shuffle=True, seed=0):
+        self.song_index = np.asarray(song_index)
+        self.batch_size = batch_size
+        self.num_streams = max(1, num_workers)
+        self.window = max(1, window)
+        self.drop_last = drop_last
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+
+        order = np.argsort(self.song_index, kind="stable")
+        (songs, starts) = np.unique(self.song_index[order], return_index=True)
+        self.songs = np.split(order, starts[1:])
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_streams(self, rng):
+        songs = np.arange(len(self.songs))
+        if self.shuffle:
+            rng.shuffle(songs)
+        streams = [[] for _ in range(self.num_streams)]
+        sizes = np.zeros(self.num_streams, dtype=np.int64)
+        for s in songs:
+            i = int(np.argmin(sizes))
+            streams[i].append(self.songs[s])
+            sizes[i] += len(self.songs[s])
+        ret = []
+        for stream in streams:
+            x = np.concatenate(stream) if len(stream) > 0 else np.zeros(0, dtype=np.int64)
+            if self.shuffle:
+                for start in range(0, len(x), self.window):
+                    rng.shuffle(x[start:start + self.window])
+            ret.append(x)
+        return ret
+
+    def get_batches(self, epoch):
+        """
+        the batches of `epoch` in the order they are yielded. the streams
+        give full batches only, the chunks left over at the end of each
+        stream are batched together last so the number of batches does not
+        depend on how the songs were split
+        """
+        rng = np.random.RandomState((self.seed, epoch))
+        streams = self.get_streams(rng)
+        batches = []
+        rest = []
+        for x in streams:
+            n = len(x) // self.batch_size
+            batches.append([x[i * self.batch_size:(i + 1) * self.batch_size].tolist() for i in range(n)])
+            rest += x[n * self.batch_size:].tolist()
+        ret = []
+        for i in range(max(len(b) for b in batches)):
+            for b in batches:
+                if i < len(b):
+                    ret.append(b[i])
+        for i in range(len(self) - len(ret)):
+            ret.append(rest[i * self.batch_size:(i + 1) * self.batch_size])
+        return ret
+
+    def __iter__(self):
+        for b in self.get_batches(self.epoch):
+            yield b
+        # loaders that never call set_epoch (k-fold) still get a new order
+        self.epoch += 1
+
+    def __len__(self):
+        if self.drop_last:
+            return len(self.song_index) // self.batch_size
+        return -(-len(self.song_index) // self.batch_size)
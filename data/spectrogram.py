@@ -0,0 +1,207 @@
+import hashlib
+import json
+import math
+
+import torch
+
+from data.precision import FLOAT32, to_float32, to_storage
+from data.store import SongArrayStore
+from utils.kernel_cache import cached_layer
+from utils.frontend import SharedSTFT, mel_filters, dct_matrix, power_to_db, MEL_HOP_LENGTH, MFCC_N_FFT, MFCC_N_MELS
+
+# names of the precomputed views, same as the model layers they replace
+STFT = "stft"
+MEL_SPEC = "mel_spec"
+MFCC = "mfcc"
+CQT = "cqt"
+
+# front end parameters of the model layers that are not arguments here
+CQT_FMIN = 32.7
+CQT_BINS_PER_OCTAVE = 12
+PAD_MODE = "reflect"
+
+# bump when the stored frames change
+STORE_VERSION = 2
+
+
+class SpectrogramStore:
+    """
+    non-trainable front end features (magnitude STFT, mel, mfcc, cqt) of
+    whole songs in song array stores named after the audio source and the
+    front end parameters. a chunk is a slice of the song's frames, so
+    overlapping chunks share one computation. chunks start on the hop grid
+    (see get_alignment) so their frames are the song's frames, only the
+    frames next to the chunk borders are computed again from the chunk with
+    the reflect padding of the model layers.
+
+    mfcc is kept as mel power and turned into dB (top_db per chunk) and the
+    DCT per chunk, the same as the model layer does for a chunk
+    """
+
+    def __init__(self, root, sr=22050, n_fft=1024, n_mels=128, n_mfcc=20, n_cqt=None, dtype=FLOAT32, source=None):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.n_mels = n_mels
+        self.n_mfcc = n_mfcc
+        self.n_cqt = n_cqt
+        self.dtype = dtype
+
+        # view -> (hop, rows)
+        self.views = {
+            STFT: (n_fft // 4, n_fft // 2 + 1),
+            MEL_SPEC: (MEL_HOP_LENGTH, n_mels),
+            MFCC: (MEL_HOP_LENGTH, MFCC_N_MELS),
+        }
+        if not n_cqt is None:
+            self.views[CQT] = (MEL_HOP_LENGTH, n_cqt)
+
+        # the stores are keyed by song id only, so they are named after
+        # everything that changes the decoded songs (`source`) and the frames
+        config = {'source': source, 'params': self.get_params()}
+        h = hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+        self.stores = {}
+        for (name, (_, rows)) in self.views.items():
+            self.stores[name] = SongArrayStore(root, "{}-{}".format(name, h), dtype=dtype, row_shape=(rows,))
+
+        self.layers = None
+        self.dct = dct_matrix(MFCC_N_MELS, n_mfcc)
+
+    def get_params(self):
+        return {
+            'version': STORE_VERSION,
+            'sr': self.sr,
+            'n_fft': self.n_fft,
+            'n_mels': self.n_mels,
+            'n_mfcc': self.n_mfcc,
+            'n_cqt': self.n_cqt,
+            'dtype': self.dtype,
+            'hops': {name: hop for (name, (hop, _)) in self.views.items()},
+            'mfcc_n_fft': MFCC_N_FFT,
+            'mfcc_n_mels': MFCC_N_MELS,
+            'cqt_fmin': CQT_FMIN,
+            'cqt_bins_per_octave': CQT_BINS_PER_OCTAVE,
+            'pad_mode': PAD_MODE
+        }
+
+    def __contains__(self, key):
+        if all(key in s for s in self.stores.values()):
+            return True
+        # another worker may have computed the song meanwhile
+        for s in self.stores.values():
+            s.refresh()
+        return all(key in s for s in self.stores.values())
+
+    def compact(self):
+        for s in self.stores.values():
+            s.compact()
+
+    def get_alignment(self):
+        """
+        chunk offsets are multiples of this, the frames of every view at such
+        an offset are frames of the song
+        """
+        ret = 1
+        for (hop, _) in self.views.values():
+            ret = ret * hop // math.gcd(ret, hop)
+        return ret
+
+    def align(self, offset):
+        return offset - offset % self.get_alignment()
+
+    def __get_layers(self):
+        if self.layers is None:
+            stft = SharedSTFT(self.n_fft)
+            mfcc_stft = SharedSTFT(MFCC_N_FFT, hop_length=MEL_HOP_LENGTH)
+            self.layers = {
+                'stft': stft,
+                'mel_filters': mel_filters(self.sr, self.n_fft, self.n_mels),
+                'mfcc_stft': mfcc_stft,
+                'mfcc_filters': mel_filters(self.sr, MFCC_N_FFT, MFCC_N_MELS),
+            }
+            if not self.n_cqt is None:
+                from nnAudio import Spectrogram
+                self.layers['cqt'] = cached_layer(Spectrogram.CQT2010v2, sr=self.sr, hop_length=MEL_HOP_LENGTH, fmin=CQT_FMIN,
+                                                  fmax=None, n_bins=self.n_cqt, filter_scale=1, bins_per_octave=CQT_BINS_PER_OCTAVE,
+                                                  norm=True, basis_norm=1, window='hann', pad_mode=PAD_MODE,
+                                                  earlydownsample=True, trainable=False, output_format='Magnitude', verbose=False)
+        return self.layers
+
+    def __get_radius(self, name):
+        """
+        samples on either side of a frame's center that the frame depends on
+        """
+        if name == MFCC:
+            return MFCC_N_FFT // 2
+        if name != CQT:
+            return self.n_fft // 2
+        # early downsampling, one lowpass filter per lower octave and the
+        # kernels of the lowest octave, all at their own rates
+        layer = self.__get_layers()['cqt']
+        factor = int(layer.downsample_factor)
+        radius = 0
+        if layer.earlydownsample:
+            radius += (layer.early_downsample_filter.shape[-1] - 1) // 2
+        octaves = layer.n_octaves - 1
+        radius += factor * (2 ** octaves - 1) * ((layer.lowpass_filter.shape[-1] - 1) // 2)
+        radius += factor * 2 ** octaves * (layer.n_fft // 2 + 1)
+        return radius
+
+    def compute(self, x, views=None):
+        """
+        {view: (frames, rows)} of the mono song `x` of shape (1, samples)
+        """
+        layers = self.__get_layers()
+        views = self.views.keys() if views is None else views
+        x = to_float32(x).reshape(1, 1, -1)
+        step = MEL_HOP_LENGTH // layers['stft'].hop_length
+        features = {}
+        with torch.no_grad():
+            if STFT in views or MEL_SPEC in views:
+                power = layers['stft'].compute(x)
+                if STFT in views:
+                    features[STFT] = torch.sqrt(power)
+                if MEL_SPEC in views:
+                    features[MEL_SPEC] = torch.matmul(layers['mel_filters'], power[:, :, ::step])
+            if MFCC in views:
+                features[MFCC] = torch.matmul(layers['mfcc_filters'], layers['mfcc_stft'].compute(x))
+            if CQT in views:
+                features[CQT] = layers['cqt'](x.reshape(1, -1))
+        return {k: v[0].T for (k, v) in features.items()}
+
+    def put(self, key, x):
+        for (name, rows) in self.compute(x).items():
+            self.stores[name].put(key, rows)
+
+    def get_chunk(self, key, x, offset, length):
+        """
+        {view: (rows, frames)} of the chunk `x` (1, samples) that starts at
+        sample `offset` of the song of `length` samples, `offset` on the grid
+        of get_alignment(). the same frames as the model layers give for the chunk
+        """
+        if offset % self.get_alignment() != 0:
+            raise Exception("Chunk offset {} is not a multiple of {}".format(offset, self.get_alignment()))
+        frame_count = x.shape[-1]
+        # samples of the chunk that are samples of the song, the rest are zeros
+        end = min(frame_count, length - offset)
+        features = {}
+        for (name, (hop, _)) in self.views.items():
+            radius = self.__get_radius(name)
+            n = frame_count // hop + 1
+            # frames [a, b) only see samples of the chunk that are also
+            # samples of the song, they are taken from the song's frames
+            a = min(n, -(-radius // hop))
+            b = max(a, min(n, (end - radius - 1) // hop + 1))
+            parts = []
+            if a > 0:
+                head = x[:, :min(frame_count, (a - 1) * hop + radius + 1)]
+                parts.append(to_storage(self.compute(head, [name])[name][:a], self.dtype))
+            if b > a:
+                parts.append(self.stores[name].get(key)[offset // hop + a:offset // hop + b])
+            if n > b:
+                start = max(0, b * hop - radius) // hop
+                parts.append(to_storage(self.compute(x[:, start * hop:], [name])[name][b - start:], self.dtype))
+            frames = torch.cat(parts, 0).T.contiguous()
+            if name == MFCC:
+                frames = torch.matmul(self.dct, power_to_db(to_float32(frames)[None])[0])
+            features[name] = frames
+        return features
@@ -1,75 +1,108 @@
+import inspect
 from os import path
 
-import torchaudio
-
 from data import *
 from data.base import BaseChunkedDataset
+from data.precision import to_storage, to_float32
+from utils.frontend import mel_filters, dct_matrix, power_to_db
 
 import numpy as np
 import librosa
+from torch.utils.data.dataloader import default_collate
 
-class StatAudioDataset(BaseChunkedDataset):
+# padding of the centered frames, the one of the installed librosa.stft
+# ("constant" since 0.10, "reflect" before)
+STFT_PAD_MODE = inspect.signature(librosa.stft).parameters['pad_mode'].default
 
-    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3"):
-        super().__init__(meta_file, temp_folder=temp_folder, force_compute=force_compute)
+class StatAudioDataset(BaseChunkedDataset):
 
-        self.sr = sr
+    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3", **kwargs):
         self.data_dir = data_dir
-        self.chunk_duration = chunk_duration
-        self.overlap = overlap
         self.audio_extension = audio_extension
-        self.frame_count = int(self.sr * self.chunk_duration)
 
-    def get_audio(self, info, args):
-        audio_file = path.join(self.data_dir, "{}.{}".format(
-            info[SONG_ID], self.audio_extension))
-        meta_data = torchaudio.info(audio_file)
-        sr = meta_data.sample_rate
-
-        frame = args
-        offset = int(sr * ((self.overlap * frame) + info[START_TIME]))
-        frames = int(sr * self.chunk_duration)
+        super().__init__(meta_file, sr=sr, chunk_duration=chunk_duration, overlap=overlap,
+                         temp_folder=temp_folder, force_compute=force_compute, **kwargs)
 
-        x, sr = torchaudio.load(
-            audio_file, frame_offset=offset, num_frames=frames)
-        return (x, sr)
+    def get_audio_file(self, info):
+        return path.join(self.data_dir, "{}.{}".format(
+            info[SONG_ID], self.audio_extension))
 
     def get_label(self, info, args):
-        y = info[[STATIC_VALENCE_MEAN, STATIC_AROUSAL_MEAN,
-                  STATIC_VALENCE_STD, STATIC_AROUSAL_STD]].to_numpy()
-        y = torch.tensor(list(y), dtype=torch.float)
+        y = info.get_values([STATIC_VALENCE_MEAN, STATIC_AROUSAL_MEAN,
+                  STATIC_VALENCE_STD, STATIC_AROUSAL_STD])
+        y = torch.tensor(y, dtype=torch.float)
         return y
 
     def get_features(self, info, args):
-        x, sr = self.get_audio(info, args)
-        x = preprocess_audio(self.frame_count, x, sr, self.sr)
+        x = self.get_chunk(info, args)
         return x
 
+class StatFeatureCollate:
+    """
+    default collate of the audio chunks followed by the STFT magnitude, mel
+    spectrogram and mfcc of the whole batch, the features of the librosa path
+    of StatAudioExtractedDataset.get_features (within float tolerance)
+    """
+
+    def __init__(self, sr, n_fft=1024, n_mels=128, n_mfcc=20, pad_mode=STFT_PAD_MODE):
+        self.n_fft = n_fft
+        self.hop_length = n_fft // 4
+        self.pad_mode = pad_mode
+        self.window = torch.hann_window(n_fft)
+        self.mel_filters = mel_filters(sr, n_fft, n_mels)
+        self.dct = dct_matrix(n_mels, n_mfcc)
+
+    def get_features(self, audio):
+        x = to_float32(audio).reshape(audio.shape[0], -1)
+        stft_x = torch.stft(x, self.n_fft, hop_length=self.hop_length, window=self.window, center=True,
+                            pad_mode=self.pad_mode, return_complex=True).abs()
+        mel_spec_x = torch.matmul(self.mel_filters, stft_x ** 2)
+        mfcc_x = torch.matmul(self.dct, power_to_db(mel_spec_x))
+        return (stft_x, mel_spec_x, mfcc_x)
+
+    def __call__(self, batch):
+        (audio_x, y) = default_collate(batch)
+        return ((audio_x, *self.get_features(audio_x)), y)
+
 class StatAudioExtractedDataset(BaseChunkedDataset):
 
-    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3"):
-        super().__init__(meta_file, temp_folder=temp_folder, force_compute=force_compute)
+    def __init__(self, meta_file, data_dir, sr=22050, chunk_duration=5, overlap=2.5, temp_folder=None, force_compute=False, audio_extension="mp3", batched_features=False, **kwargs):
+        # the spectrograms are computed from the resampled chunk in get_features
+        for arg in ["deferred_resample", "spectrograms"]:
+            if kwargs.get(arg, None):
+                raise Exception("{} is not supported by {}".format(arg, type(self).__name__))
 
-        self.sr = sr
         self.data_dir = data_dir
-        self.chunk_duration = chunk_duration
-        self.overlap = overlap
         self.audio_extension = audio_extension
-        self.frame_count = int(self.sr * self.chunk_duration)
 
-    def get_audio(self, info, args):
-        audio_file = path.join(self.data_dir, "{}.{}".format(
+        super().__init__(meta_file, sr=sr, chunk_duration=chunk_duration, overlap=overlap,
+                         temp_folder=temp_folder, force_compute=force_compute, **kwargs)
+
+        # yield the audio chunk alone and compute the spectrograms per batch
+        # in the collate (StatFeatureCollate) instead of per item with librosa
+        self.batched_features = batched_features
+
+    def get_audio_file(self, info):
+        return path.join(self.data_dir, "{}.{}".format(
             info[SONG_ID], self.audio_extension))
-        meta_data = torchaudio.info(audio_file)
-        sr = meta_data.sample_rate
 
-        frame = args
-        offset = int(sr * ((self.overlap * frame) + info[START_TIME]))
-        frames = int(sr * self.chunk_duration)
+    def use_feature_cache(self):
+        if self.batched_features:
+            return super().use_feature_cache()
+        # spectrograms are still worth caching with the waveform store enabled
+        return True
 
-        x, sr = torchaudio.load(
-            audio_file, frame_offset=offset, num_frames=frames)
-        return (x, sr)
+    def get_cache_config(self):
+        return {
+            **super().get_cache_config(),
+            'batched_features': self.batched_features,
+            'stft_pad_mode': STFT_PAD_MODE
+        }
+
+    def get_collate_fn(self):
+        if self.batched_features:
+            return StatFeatureCollate(self.sr)
+        return super().get_collate_fn()
 
     def get_stft(self, audio, n_fft=1024):
         return librosa.stft(audio, n_fft=n_fft)
@@ -82,14 +115,16 @@ class StatAudioExtractedDataset(BaseChunkedDataset):
         return librosa.feature.mfcc(S=librosa.power_to_db(mel_spec))
 
     def get_label(self, info, args):
-        y = info[[STATIC_VALENCE_MEAN, STATIC_AROUSAL_MEAN,
-                  STATIC_VALENCE_STD, STATIC_AROUSAL_STD]].to_numpy()
-        y = torch.tensor(list(y), dtype=torch.float)
+        y = info.get_values([STATIC_VALENCE_MEAN, STATIC_AROUSAL_MEAN,
+                  STATIC_VALENCE_STD, STATIC_AROUSAL_STD])
+        y = torch.tensor(y, dtype=torch.float)
         return y
 
     def get_features(self, info, args):
-        audio_x, sr = self.get_audio(info, args)
-        audio_x = preprocess_audio(self.frame_count, audio_x, sr, self.sr)
+        if self.batched_features:
+            return self.get_chunk(info, args)
+
+        audio_x = to_float32(self.get_chunk(info, args))
 
         ## stft
         audio_np = torch.squeeze(audio_x, 0).numpy()
@@ -104,5 +139,8 @@ class StatAudioExtractedDataset(BaseChunkedDataset):
         ## mfcc
         mfcc_x = torch.tensor(self.get_mfcc(mel_spec_np), dtype=torch.float)
 
+        audio_x = to_storage(audio_x, self.waveform_dtype)
+        (stft_x, mel_spec_x, mfcc_x) = to_storage((stft_x, mel_spec_x, mfcc_x), self.feature_dtype)
+
         return (audio_x, stft_x, mel_spec_x, mfcc_x)
 
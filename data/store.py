@@ -0,0 +1,188 @@
+import fcntl
+import json
+import os
+from os import path
+
+import numpy as np
+import torch
+
+
+class SongArrayStore:
+    """
+    Append-only on-disk store that keeps one array per song in a single flat
+    memory-mapped file (songs are concatenated along the first axis) plus a
+    json index of {key: [offset, length]}. Reads are zero-copy views into the
+    memory map. Writers append under an exclusive file lock, new index entries
+    go to an append-only log next to the json index (one line per song) which
+    compact() folds back into the json, so several workers/processes can fill
+    the same store without rewriting the whole index per song.
+    """
+
+    def __init__(self, root, name, dtype="float32", row_shape=()):
+        self.root = root
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.row_shape = tuple(row_shape)
+        self.row_size = int(np.prod(self.row_shape)) if len(self.row_shape) > 0 else 1
+
+        self.data_file = path.join(root, "{}.bin".format(name))
+        self.index_file = path.join(root, "{}.index.json".format(name))
+        self.log_file = path.join(root, "{}.index.log".format(name))
+        self.lock_file = path.join(root, "{}.lock".format(name))
+
+        os.makedirs(root, exist_ok=True)
+        # the log always exists, compactions only replace it
+        open(self.log_file, mode="a").close()
+
+        self.index = {}
+        self.data = None
+        # inode and read position of the index log
+        self.log_ino = None
+        self.log_pos = 0
+        self.__load_index()
+
+    def __getstate__(self):
+        # never pickle the memory map itself, workers re-open it lazily
+        state = self.__dict__.copy()
+        state['data'] = None
+        return state
+
+    def __load_index(self):
+        # the log is identified before the json is read, a compaction in
+        # between shows up as a new log and the index is read again
+        self.log_ino = os.stat(self.log_file).st_ino if path.exists(self.log_file) else None
+        self.log_pos = 0
+        self.index = {}
+        if path.exists(self.index_file):
+            with open(self.index_file, mode="r") as f:
+                self.index = json.load(f)
+        self.__read_log()
+        self.data = None
+
+    def __read_log(self):
+        """
+        add the log entries written since the last read, the whole index is
+        read again when the log was replaced by a compaction
+        """
+        try:
+            st = os.stat(self.log_file)
+        except FileNotFoundError:
+            return
+        if st.st_ino != self.log_ino:
+            self.__load_index()
+            return
+        if st.st_size <= self.log_pos:
+            return
+        with open(self.log_file, mode="rb") as f:
+            f.seek(self.log_pos)
+            data = f.read()
+        # a line that is still being written is read next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            (key, offset, length) = json.loads(line)
+            self.index[key] = [offset, length]
+        self.log_pos += end
+
+    def __map(self):
+        if self.data is None:
+            n = path.getsize(self.data_file) // (self.dtype.itemsize * self.row_size)
+            # copy-on-write so torch.from_numpy gets a writable array, pages
+            # are still shared with the page cache until someone writes
+            self.data = np.memmap(self.data_file, dtype=self.dtype, mode="c",
+                                  shape=(n, *self.row_shape))
+        return self.data
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return str(key) in self.index
+
+    def refresh(self):
+        self.__read_log()
+
+    def get(self, key):
+        """
+        array stored for `key` as a tensor view of shape (length, *row_shape),
+        None when the key is not in the store
+        """
+        key = str(key)
+        if not key in self.index:
+            self.__read_log()
+            if not key in self.index:
+                return None
+        (offset, length) = self.index[key]
+        data = self.__map()
+        if offset + length > data.shape[0]:
+            self.data = None
+            data = self.__map()
+        return torch.from_numpy(data[offset:offset + length])
+
+    def put(self, key, x):
+        self.put_many([(key, x)])
+
+    def put_many(self, items):
+        """
+        append several (key, array) pairs under a single lock and a single
+        index update, keys that are already stored are skipped
+        """
+        arrays = []
+        for (key, x) in items:
+            if torch.is_tensor(x):
+                x = x.numpy()
+            x = np.ascontiguousarray(x, dtype=self.dtype)
+            if tuple(x.shape[1:]) != self.row_shape:
+                raise Exception("Expected rows of shape {} got {}".format(self.row_shape, x.shape[1:]))
+            arrays.append((str(key), x))
+        with open(self.lock_file, mode="a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.__read_log()
+                arrays = [(k, x) for (k, x) in arrays if not k in self.index]
+                if len(arrays) == 0:
+                    return
+                row_bytes = self.dtype.itemsize * self.row_size
+                offset = 0
+                if path.exists(self.data_file):
+                    offset = path.getsize(self.data_file) // row_bytes
+                # seek instead of appending so a partial row left behind by
+                # a crashed writer gets overwritten rather than misaligning
+                entries = {}
+                with open(self.data_file, mode="r+b" if offset > 0 else "wb") as f:
+                    f.seek(offset * row_bytes)
+                    for (key, x) in arrays:
+                        if key in entries:
+                            continue
+                        f.write(x.tobytes())
+                        entries[key] = [offset, int(x.shape[0])]
+                        offset += x.shape[0]
+                # the data is written before its index entries show up
+                lines = "".join(json.dumps([k, o, n]) + "\n" for (k, (o, n)) in entries.items())
+                with open(self.log_file, mode="a") as f:
+                    f.write(lines)
+                self.__read_log()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def compact(self):
+        """
+        fold the index log into the json index, readers notice the new log
+        and read the index again
+        """
+        with open(self.lock_file, mode="a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.__read_log()
+                if self.log_pos == 0:
+                    return
+                tmp_file = "{}.{}.tmp".format(self.index_file, os.getpid())
+                with open(tmp_file, mode="w") as f:
+                    json.dump(self.index, f)
+                os.replace(tmp_file, self.index_file)
+                tmp_file = "{}.{}.tmp".format(self.log_file, os.getpid())
+                open(tmp_file, mode="w").close()
+                os.replace(tmp_file, self.log_file)
+                self.log_ino = os.stat(self.log_file).st_ino
+                self.log_pos = 0
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
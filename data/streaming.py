@@ -0,0 +1,119 @@
+import numpy as np
+from torch.utils.data import IterableDataset, get_worker_info
+
+from data.precompute import group_by_song
+
+STREAM_BUFFER_SIZE = 1024
+
+
+class StreamingChunkedDataset(IterableDataset):
+    """
+    iterable view of a chunked dataset that reads one song at a time
+
+    songs are shuffled with a seed shared by all DataLoader workers and dealt
+    round robin, so every worker reads a disjoint set of songs sequentially.
+    the chunks of each song go through a bounded shuffle buffer before they
+    are yielded. the wrapped dataset should have a song cache or a waveform
+    store, otherwise every chunk is still read on its own.
+    """
+
+    def __init__(self, dataset, buffer_size=STREAM_BUFFER_SIZE, shuffle=True, seed=0):
+        self.dataset = dataset
+        self.buffer_size = max(1, int(buffer_size))
+        self.shuffle = shuffle
+        self.seed = seed
+        self.epoch = 0
+        self.songs = group_by_song(dataset, range(len(dataset)))
+        # loader settings, see configure_loader
+        self.batch_size = None
+        self.num_workers = 0
+        self.drop_last = False
+
+        if dataset.waveform_store is None and not dataset.song_cache.enabled:
+            print("Warning: streaming without song cache or waveform store, songs are decoded per chunk")
+
+    def configure_loader(self, batch_size, num_workers, drop_last):
+        """
+        settings of the DataLoader, every worker batches its own songs and
+        yields get_worker_size() items
+        """
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.drop_last = drop_last
+
+    def __len__(self):
+        # items yielded this epoch, len(loader) is then the number of batches
+        if self.batch_size is None:
+            return len(self.dataset)
+        return self.get_worker_size() * max(1, self.num_workers)
+
+    def get_worker_size(self):
+        """
+        items every worker yields once the loader is configured, a multiple
+        of the batch size that is the same for all workers and epochs (the
+        Trainer reads len(loader) once). a worker with more chunks stops
+        early, one with fewer starts over with its own songs
+        """
+        workers = max(1, self.num_workers)
+        if self.drop_last:
+            return (len(self.dataset) // workers) // self.batch_size * self.batch_size
+        per_worker = -(-len(self.dataset) // workers)
+        return -(-per_worker // self.batch_size) * self.batch_size
+
+    def __getattr__(self, name):
+        # get_labels, frames, ... of the wrapped dataset
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def get_worker_songs(self, worker_id=None, num_workers=None):
+        """
+        songs read by a worker this epoch, the current DataLoader worker by default
+        """
+        if worker_id is None:
+            worker = get_worker_info()
+            (worker_id, num_workers) = (0, 1) if worker is None else (worker.id, worker.num_workers)
+        order = np.arange(len(self.songs))
+        if self.shuffle:
+            np.random.RandomState(self.seed + self.epoch).shuffle(order)
+        order = order[worker_id::num_workers]
+        return [self.songs[i] for i in order]
+
+    def get_worker_indices(self, worker_id=None, num_workers=None):
+        """
+        dataset indices read by a worker this epoch, cut or padded to
+        get_worker_size() once the loader is configured
+        """
+        indices = [i for song in self.get_worker_songs(worker_id, num_workers) for i in song]
+        if self.batch_size is None:
+            return indices
+        size = self.get_worker_size()
+        if len(indices) == 0:
+            # more workers than songs
+            indices = [i for song in self.songs for i in song]
+        while len(indices) < size:
+            indices += indices[:size - len(indices)]
+        return indices[:size]
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id = 0 if worker is None else worker.id
+        rng = np.random.RandomState((self.seed, self.epoch, worker_id))
+
+        buffer = []
+        for index in self.get_worker_indices():
+            item = self.dataset[index]
+            if not self.shuffle:
+                yield item
+            elif len(buffer) < self.buffer_size:
+                buffer.append(item)
+            else:
+                i = rng.randint(len(buffer))
+                yield buffer[i]
+                buffer[i] = item
+        rng.shuffle(buffer)
+        for item in buffer:
+            yield item
@@ -0,0 +1,155 @@
+import json
+import os
+import time
+from os import path
+from multiprocessing import Pool
+
+import numpy as np
+import torch
+import torchaudio
+
+from data import resample_audio
+
+WAV = "wav"
+FLAC = "flac"
+NPY = "npy"
+FORMATS = [WAV, FLAC, NPY]
+
+MANIFEST_FILE = "manifest.json"
+
+
+def get_transcode_dir(audio_dir, sr):
+    return path.join(audio_dir, "transcoded-{}".format(sr))
+
+
+def load_manifest(audio_dir, sr):
+    """
+    manifest of the transcoded copies of `audio_dir` at `sr`, None if the
+    folder was not transcoded
+    """
+    manifest_file = path.join(get_transcode_dir(audio_dir, sr), MANIFEST_FILE)
+    if not path.exists(manifest_file):
+        return None
+    with open(manifest_file, mode="r") as f:
+        manifest = json.load(f)
+    if manifest['sr'] != sr:
+        return None
+    return manifest
+
+
+def is_current(entry, src):
+    """
+    whether the manifest `entry` was transcoded from the current `src`
+    """
+    try:
+        st = os.stat(src)
+    except FileNotFoundError:
+        return False
+    return (entry.get('size'), entry.get('mtime')) == (st.st_size, st.st_mtime)
+
+
+def load_audio(audio_file, frame_offset=0, num_frames=-1):
+    """
+    torchaudio.load that also reads the raw float arrays written by the
+    transcoder, those are memory-mapped so only the requested frames are read
+    """
+    if audio_file.endswith("." + NPY):
+        x = np.load(audio_file, mmap_mode="r")
+        end = len(x) if num_frames < 0 else frame_offset + num_frames
+        x = torch.from_numpy(np.array(x[frame_offset:end], dtype=np.float32))
+        return torch.unsqueeze(x, 0)
+    x, _ = torchaudio.load(audio_file, frame_offset=frame_offset, num_frames=num_frames)
+    return x
+
+
+def transcode_file(src, dst, sr, fmt):
+    x, src_sr = torchaudio.load(src)
+    x = resample_audio(x, src_sr, sr)
+
+    tmp = "{}.{}.tmp".format(dst, os.getpid())
+    if fmt == NPY:
+        with open(tmp, mode="wb") as f:
+            np.save(f, x[0].numpy().astype(np.float32))
+    elif fmt == FLAC:
+        # FLAC only holds integer PCM: 24 bit keeps the quantization far below
+        # the mp3 noise floor, but samples beyond +-1 are clipped. npy keeps
+        # the resampled float32 as it is
+        torchaudio.save(tmp, x, sr, format=FLAC, bits_per_sample=24)
+    else:
+        torchaudio.save(tmp, x, sr, format=WAV)
+    os.replace(tmp, dst)
+    return x.shape[1]
+
+
+def _transcode_item(item):
+    (src, dst, sr, fmt) = item
+    try:
+        return (src, transcode_file(src, dst, sr, fmt))
+    except Exception as e:
+        print("Warning: could not transcode {} - {}".format(src, e))
+        return (src, None)
+
+
+def find_audio_dirs(root, extension):
+    ret = {}
+    for (d, _, files) in os.walk(root):
+        if path.basename(d).startswith("transcoded-"):
+            continue
+        files = sorted([f for f in files if f.endswith("." + extension)])
+        if len(files) > 0:
+            ret[d] = files
+    return ret
+
+
+def transcode_folder(root, sr, fmt=FLAC, extension="mp3", num_workers=1):
+    """
+    convert every `extension` file below `root` to mono `fmt` at `sr`,
+    each audio folder gets a transcoded-<sr> folder with a manifest.
+    files whose size and mtime did not change since the last run are skipped.
+    flac is 24 bit PCM (clips float samples beyond +-1), wav and npy are float32
+    """
+    if not fmt in FORMATS:
+        raise Exception("Unknown transcode format {}, expected one of {}".format(fmt, FORMATS))
+
+    for (audio_dir, files) in find_audio_dirs(root, extension).items():
+        out_dir = get_transcode_dir(audio_dir, sr)
+        os.makedirs(out_dir, exist_ok=True)
+
+        manifest = load_manifest(audio_dir, sr)
+        entries = {} if manifest is None else manifest['files']
+
+        todo = []
+        stats = {}
+        for name in files:
+            src = path.join(audio_dir, name)
+            st = os.stat(src)
+            stats[name] = (st.st_size, st.st_mtime)
+            dst_name = "{}.{}".format(path.splitext(name)[0], fmt)
+            e = entries.get(name)
+            if not e is None and e['file'] == dst_name and (e['size'], e['mtime']) == stats[name] \
+                    and path.exists(path.join(out_dir, dst_name)):
+                continue
+            todo.append((src, path.join(out_dir, dst_name), sr, fmt))
+
+        print("Transcode: {} - {} files, {} to convert".format(audio_dir, len(files), len(todo)))
+        start = time.time()
+        with Pool(num_workers) as pool:
+            for (src, frames) in pool.imap_unordered(_transcode_item, todo):
+                name = path.basename(src)
+                if frames is None:
+                    entries.pop(name, None)
+                    continue
+                entries[name] = {
+                    'file': "{}.{}".format(path.splitext(name)[0], fmt),
+                    'frames': frames,
+                    'size': stats[name][0],
+                    'mtime': stats[name][1]
+                }
+        print("Transcode: done in {:.1f}s".format(time.time() - start))
+
+        manifest = {'sr': sr, 'format': fmt, 'files': entries}
+        manifest_file = path.join(out_dir, MANIFEST_FILE)
+        tmp = "{}.{}.tmp".format(manifest_file, os.getpid())
+        with open(tmp, mode="w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, manifest_file)
@@ -0,0 +1,80 @@
+import os
+import threading
+import time
+from multiprocessing import Pool, cpu_count
+
+from data import profile
+
+WARMER_CHUNK_SIZE = 32
+
+_dataset = None
+
+
+def get_warmer_processes():
+    # leave most of the cores to the loader workers and the training process
+    return max(1, cpu_count() // 4)
+
+
+def _init_warmer(dataset, shared):
+    global _dataset
+    _dataset = dataset
+    profile.init_process(shared)
+    os.nice(10)
+
+
+def _warm_indices(indices):
+    n = 0
+    for index in indices:
+        if not _dataset.is_cached(index):
+            _dataset.precompute(index)
+            n += 1
+    return n
+
+
+class CacheWarmer:
+    """
+    fills the feature cache in the background, in the order the sampler will
+    ask for the items, with a small pool of low priority processes. items the
+    loader workers got to first are skipped, the cache writes are atomic so
+    both sides computing the same item is harmless
+    """
+
+    def __init__(self, dataset, num_processes=None, chunk_size=WARMER_CHUNK_SIZE):
+        self.dataset = dataset
+        self.num_processes = get_warmer_processes() if num_processes is None else num_processes
+        self.chunk_size = chunk_size
+        self.pool = None
+        self.thread = None
+
+    def start(self, indices, skip=0):
+        """
+        warm `indices` (upcoming sampler order), the first `skip` are left to
+        the loader as it is already working on them
+        """
+        self.stop()
+        indices = list(indices)[skip:]
+        if len(indices) == 0:
+            return
+        chunks = [indices[i:i + self.chunk_size] for i in range(0, len(indices), self.chunk_size)]
+        self.pool = Pool(processes=self.num_processes, initializer=_init_warmer, initargs=(self.dataset, profile.get_shared()))
+        self.thread = threading.Thread(target=self.__run, args=(self.pool, chunks), daemon=True)
+        self.thread.start()
+
+    def __run(self, pool, chunks):
+        start = time.time()
+        done = 0
+        try:
+            for n in pool.imap(_warm_indices, chunks):
+                done += n
+        except Exception as e:
+            # terminated by stop() or a failing item, the loader computes the rest
+            print("Warning: cache warmer stopped - {}".format(e))
+            return
+        print("Cache warmer: computed {} items in {:.1f}s".format(done, time.time() - start))
+        pool.close()
+
+    def stop(self):
+        if not self.pool is None:
+            self.pool.terminate()
+            self.pool = None
+        self.thread = None
@@ -8,6 +8,12 @@ python exec.py check (run_location) [--shape] -> check data loader and forward p
 
 python exec.py train (run_location) -> train run
 
+python exec.py precompute (run_location) [--num-workers N] -> fill the feature cache of the run's datasets
+
+python exec.py bench-data (run_location) [--workers 0,4] [--batch-sizes 16,32] [--batches N] [--output file.json] -> measure data loader throughput
+
+python exec.py transcode (run_location) [--format flac|wav|npy] [--num-workers N] -> convert the run's raw audio to mono at the run's sr
+
 
 """
 
@@ -35,6 +41,15 @@ from pytorch_lightning.loggers import WandbLogger
 import torchinfo
 import wandb
 from utils import kfold
+from utils import kernel_cache
+from data.precompute import precompute_dataset
+from data.resample import get_collate_fn
+from data.streaming import StreamingChunkedDataset, STREAM_BUFFER_SIZE
+from data.resident import ResidentDataset
+from data.transcode import transcode_folder, FORMATS, FLAC
+from data.bench import bench_loader
+import json
+import tempfile
 import shutil
 
 ENTITY = "thasthika"
@@ -53,6 +68,10 @@ BASE_CONFIG = __load_default_config()
 DATA_DIR = BASE_CONFIG['data_dir']
 TEMP_DIR = BASE_CONFIG['temp_dir']
 
+# nnAudio layers are built once and reloaded by later runs from a folder
+# private to the current user
+kernel_cache.set_cache_dir(kernel_cache.get_user_cache_dir(TEMP_DIR))
+
 def __get_model_info(fp):
     _cn = list(filter(lambda x: x.startswith("class"),
                open(fp, mode="r").readlines()))[0]
@@ -170,13 +189,23 @@ def __is_kfold(data_config):
     return "kfold" in data_config['split']
 
 
-def __parse_data_args(data_config):
+def __get_spectrogram_params(model_params):
+    # front end parameters of the model for `spectrograms: true`
+    if model_params.get('spec_trainable', False):
+        print("Warning: spec_trainable models compute their spectrograms, not using precomputed ones")
+        return None
+    return {k: model_params[k] for k in ['n_fft', 'n_mels', 'n_mfcc', 'n_cqt'] if k in model_params}
+
+
+def __parse_data_args(data_config, model_params=None):
 
     dataset_name = data_config['dataset']
     split_name = data_config['split']
     sub_folder = data_config['sub_folder'] if 'sub_folder' in data_config else None
     data_class = data_config['class'] if 'class' in data_config else None
     data_params = data_config['params'] if 'params' in data_config else {}
+    if data_params.get('spectrograms', None) == True and not model_params is None:
+        data_params = {**data_params, 'spectrograms': __get_spectrogram_params(model_params)}
 
     temp_folder = path.join(TEMP_DIR, data_config['temp_folder'])
 
@@ -204,15 +233,28 @@ def __parse_data_args(data_config):
     return (ret, data_class)
 
 
-def __make_datasets(DataClass, data_folder, train_meta, validation_meta=None, test_meta=None, temp_folder=None, force_compute=False, sr=22050, duration=5.0, overlap=2.5, ext="mp3"):
+def __make_datasets(DataClass, data_folder, train_meta, validation_meta=None, test_meta=None, temp_folder=None, force_compute=False, sr=22050, duration=5.0, overlap=2.5, ext="mp3", streaming=False, resident=False, **kwargs):
     train_ds = DataClass(train_meta, data_folder, temp_folder=temp_folder, chunk_duration=duration,
-                        overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext)
+                        overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext, **kwargs)
+    if streaming and resident:
+        raise Exception("Data params streaming and resident can not be used together")
+    if streaming and validation_meta is None:
+        # kfold splits pick training chunks by index through Subset
+        raise Exception("Data param streaming can not be used with kfold splits")
+    if streaming:
+        # streaming: true or the shuffle buffer size
+        buffer_size = STREAM_BUFFER_SIZE if streaming == True else streaming
+        train_ds = StreamingChunkedDataset(train_ds, buffer_size=buffer_size)
     test_ds = DataClass(test_meta, data_folder, temp_folder=temp_folder, chunk_duration=duration,
-                        overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext)
+                        overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext, **kwargs)
     validation_ds = None
     if not validation_meta is None:
         validation_ds = DataClass(train_meta, data_folder, temp_folder=temp_folder, chunk_duration=duration,
-                                  overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext)
+                                  overlap=overlap, force_compute=force_compute, sr=sr, audio_extension=ext, **kwargs)
+    if resident:
+        # load everything into shared memory before the loader workers fork
+        (train_ds, test_ds, validation_ds) = [None if ds is None else ResidentDataset(ds, num_workers=__get_num_workers())
+                                              for ds in (train_ds, test_ds, validation_ds)]
     return (train_ds, test_ds, validation_ds)
 
 def __parse_variable(v):
@@ -332,7 +374,7 @@ def check(run, check_data, check_summary, model_version):
 
     if check_data:
         
-        (data_args, data_class) = __parse_data_args(run_config['data'])
+        (data_args, data_class) = __parse_data_args(run_config['data'], run_config['model']['params'])
         print("DataClass Args:")
         print("Data Folder: {}".format(data_args['data_folder']))
         print("Temp Folder: {}".format(data_args['temp_folder']))
@@ -343,8 +385,9 @@ def check(run, check_data, check_summary, model_version):
         for ds in dss:
             if ds is None:
                 continue
-            dl = DataLoader(ds, batch_size=2, num_workers=2, drop_last=True)
-            for (X, _) in dl:
+            dl = DataLoader(ds, batch_size=2, num_workers=2, drop_last=True, collate_fn=get_collate_fn(ds))
+            for (X, y) in dl:
+                (X, _) = model.on_after_batch_transfer((X, y), 0)
                 model(X)
                 break
         print("Check: forward passes ok!")
@@ -392,7 +435,7 @@ def train(ctx: click.Context, run, use_wandb, batch_size, temp_folder, model_ver
     (ModelClass, model_info) = __load_model_class(
         run, run_config['model']['version'])
 
-    (data_args, data_class) = __parse_data_args(run_config['data'])
+    (data_args, data_class) = __parse_data_args(run_config['data'], run_config['model']['params'])
     DataClass = __load_data_class(run, data_class)
 
     (train_ds, test_ds, validation_ds) = __make_datasets(DataClass, **data_args)
@@ -429,6 +472,7 @@ def train(ctx: click.Context, run, use_wandb, batch_size, temp_folder, model_ver
             early_stop_mode=model.EARLY_STOPPING_MODE,
             use_wandb=use_wandb,
             cv_dry_run=False,
+            song_sampler_window=model.get_song_sampler_window(),
             wandb_tags=__get_wandb_tags(
                 model_info['name'], model_info['version'], run_config['data']['dataset'], additional_tags),
             config=config,
@@ -515,7 +559,7 @@ def sweep(run, batch_size, dataset, split, temp_folder, model_version, auto_batc
 
     (ModelClass, model_info) = __load_model_class(run, run_config['model']['version'])
 
-    (data_args, data_class) = __parse_data_args(run_config['data'])
+    (data_args, data_class) = __parse_data_args(run_config['data'], run_config['model']['params'])
     DataClass = __load_data_class(run, data_class)
 
     (train_ds, test_ds, validation_ds) = __make_datasets(DataClass, **data_args)
@@ -570,6 +614,127 @@ def sweep(run, batch_size, dataset, split, temp_folder, model_version, auto_batc
 
     trainer.test(model)
 
+@click.command("precompute")
+@click.argument("run", required=True)
+@click.option("--dataset", type=str, required=False)
+@click.option("--split", type=str, required=False)
+@click.option("--temp-folder", type=str, required=False)
+@click.option("--num-workers", type=int, required=False)
+def precompute(run, dataset, split, temp_folder, num_workers):
+
+    run_dir = path.join(WORKING_DIR, "runs")
+
+    (rd, run_file) = __parse_run_location(run)
+    run_dir = path.join(run_dir, rd)
+
+    run_config = __load_yaml_file(path.join(run_dir, run_file))
+
+    if not temp_folder is None:
+        run_config['data']['temp_folder'] = temp_folder
+    if not dataset is None:
+        run_config['data']['dataset'] = dataset
+    if not split is None:
+        run_config['data']['split'] = split
+    if num_workers is None:
+        num_workers = __get_num_workers()
+
+    (data_args, data_class) = __parse_data_args(run_config['data'], run_config['model']['params'])
+    DataClass = __load_data_class(run, data_class)
+
+    print("Data Folder: {}".format(data_args['data_folder']))
+    print("Temp Folder: {}".format(data_args['temp_folder']))
+    print("Workers: {}".format(num_workers))
+
+    (train_ds, test_ds, validation_ds) = __make_datasets(DataClass, **data_args)
+    print("Datasets Created...")
+
+    for (name, ds) in [("train", train_ds), ("test", test_ds), ("val", validation_ds)]:
+        if ds is None:
+            continue
+        print("Precomputing {} dataset...".format(name))
+        precompute_dataset(ds, num_workers=num_workers)
+
+def __parse_int_list(v):
+    return [int(x) for x in v.split(",") if x.strip() != ""]
+
+@click.command("bench-data")
+@click.argument("run", required=True)
+@click.option("--split", type=click.Choice(["train", "test", "val"]), default="train")
+@click.option("--workers", type=str, default="0,2,4,8", help="comma separated num_workers values")
+@click.option("--batch-sizes", type=str, default="16,32", help="comma separated batch sizes")
+@click.option("--batches", type=int, default=50, help="batches per measurement")
+@click.option("--cache", type=str, default="cold,warm", help="cold (empty temp folder) and/or warm")
+@click.option("--output", type=str, required=False, help="json file for the results")
+def bench_data(run, split, workers, batch_sizes, batches, cache, output):
+
+    run_dir = path.join(WORKING_DIR, "runs")
+
+    (rd, run_file) = __parse_run_location(run)
+    run_dir = path.join(run_dir, rd)
+
+    run_config = __load_yaml_file(path.join(run_dir, run_file))
+    (data_args, data_class) = __parse_data_args(run_config['data'], run_config['model']['params'])
+    DataClass = __load_data_class(run, data_class)
+
+    split_index = {"train": 0, "test": 1, "val": 2}[split]
+    caches = [c.strip() for c in cache.split(",") if c.strip() != ""]
+
+    results = []
+    for cache_state in caches:
+        for batch_size in __parse_int_list(batch_sizes):
+            for num_workers in __parse_int_list(workers):
+                args = {**data_args}
+                if cache_state == "cold":
+                    args['temp_folder'] = tempfile.mkdtemp(prefix="bench-", dir=TEMP_DIR)
+                ds = __make_datasets(DataClass, **args)[split_index]
+                if ds is None:
+                    raise Exception("Run {} has no {} split".format(run, split))
+                if cache_state == "warm":
+                    # fill the caches with the same items first
+                    bench_loader(ds, batch_size, num_workers, batches, collate_fn=get_collate_fn(ds))
+                r = bench_loader(ds, batch_size, num_workers, batches, collate_fn=get_collate_fn(ds))
+                r['cache'] = cache_state
+                results.append(r)
+                print("{:5s} bs={:<4d} workers={:<3d} {:8.1f} samples/s p50={:.1f}ms p99={:.1f}ms workers rss={:.0f}MB".format(
+                    cache_state, batch_size, num_workers, r['samples_per_s'],
+                    r['latency_p50_ms'] or 0, r['latency_p99_ms'] or 0, r['worker_rss_total_mb']))
+                if cache_state == "cold":
+                    shutil.rmtree(args['temp_folder'], ignore_errors=True)
+
+    if not output is None:
+        with open(output, mode="w") as f:
+            json.dump({'run': run, 'split': split, 'data': run_config['data'], 'results': results}, f, indent=2)
+        print("Results written to {}".format(output))
+
+@click.command("transcode")
+@click.argument("run", required=True)
+@click.option("--dataset", type=str, required=False)
+@click.option("--format", "fmt", type=click.Choice(FORMATS), default=FLAC)
+@click.option("--num-workers", type=int, required=False)
+def transcode(run, dataset, fmt, num_workers):
+
+    run_dir = path.join(WORKING_DIR, "runs")
+
+    (rd, run_file) = __parse_run_location(run)
+    run_dir = path.join(run_dir, rd)
+
+    run_config = __load_yaml_file(path.join(run_dir, run_file))
+
+    if not dataset is None:
+        run_config['data']['dataset'] = dataset
+    if num_workers is None:
+        num_workers = __get_num_workers()
+
+    (data_args, _) = __parse_data_args(run_config['data'], run_config['model']['params'])
+    sr = data_args['sr'] if 'sr' in data_args else 22050
+    ext = data_args['ext'] if 'ext' in data_args else "mp3"
+
+    print("Data Folder: {}".format(data_args['data_folder']))
+    print("Sample Rate: {} Format: {}".format(sr, fmt))
+
+    # the datasets pick up <audio folder>/transcoded-<sr> when their sr matches
+    transcode_folder(data_args['data_folder'], sr, fmt=fmt, extension=ext, num_workers=num_workers)
+
 @click.command("download-checkpoint")
 @click.argument("run_id", required=True)
 @click.option("--model-name", type=str, required=True)
@@ -604,6 +769,9 @@ cli.add_command(clist)
 cli.add_command(check)
 cli.add_command(train)
 cli.add_command(sweep)
+cli.add_command(precompute)
+cli.add_command(transcode)
+cli.add_command(bench_data)
 cli.add_command(download_checkpoint)
 
 if __name__ == "__main__":
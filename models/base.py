@@ -1,6 +1,29 @@
 import pytorch_lightning as pl
 import torch
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, IterableDataset
+
+from data.precision import to_float32
+from data.profile import get_worker_init_fn
+from data.resample import get_collate_fn
+from data.sampler import SongBatchSampler, get_song_index, SONG_WINDOW
+from data.warmer import CacheWarmer
+from data.embeddings import BERT_MODEL, POOLED
+
+# frozen BERT per (model name, device), loaded on first use
+_bert = {}
+
+
+def get_bert(model_name, device):
+    key = (model_name, str(device))
+    if not key in _bert:
+        from transformers import BertTokenizer, BertModel
+        tokenizer = BertTokenizer.from_pretrained(model_name)
+        model = BertModel.from_pretrained(model_name).to(device)
+        model.eval()
+        for param in model.parameters():
+            param.requires_grad = False
+        _bert[key] = (tokenizer, model)
+    return _bert[key]
 
 
 class BaseModel(pl.LightningModule):
@@ -9,6 +32,17 @@ class BaseModel(pl.LightningModule):
     MOMENTUM = "momentum"
     WEIGHT_DECAY = "weight_decay"
     DROPOUT = "dropout"
+    # true or a shuffle window size to batch chunks of the same song per worker
+    SONG_SAMPLER = "song_sampler"
+    # true or a process count to precompute the cache ahead of the loader
+    CACHE_WARMER = "cache_warmer"
+    # magnitude/mel/mfcc layers from one STFT per batch (utils.frontend)
+    SHARED_STFT = "shared_stft"
+    SPEC_TRAINABLE = "spec_trainable"
+
+    # frozen BERT output the lyrics layers take, POOLED (batch, hidden) or
+    # SEQUENCE (batch, tokens, hidden), see get_lyrics_embedding
+    LYRICS_EMBEDDINGS = POOLED
 
     EARLY_STOPPING = "val/loss"
     EARLY_STOPPING_MODE = "min"
@@ -32,6 +66,10 @@ class BaseModel(pl.LightningModule):
         self.test_ds = test_ds
 
         self.config = model_config
+        self.train_sampler = None
+        self.cache_warmer = None
+        # (audio, {view: tensor}) of the last batch from a spectrogram store
+        self.spectrograms = None
 
     def configure_optimizers(self):
         optimizer = None
@@ -50,17 +88,125 @@ class BaseModel(pl.LightningModule):
             raise ModuleNotFoundError(f"Optimizer named {o} was not found!")
         return optimizer
 
+    def load_state_dict(self, state_dict, strict=True):
+        # checkpoints from before BERT was loaded lazily carry its weights
+        state_dict = {k: v for (k, v) in state_dict.items() if not k.startswith("bert_model.")}
+        return super().load_state_dict(state_dict, strict=strict)
+
+    def get_lyrics_embedding(self, lyrics_x):
+        """
+        frozen BERT output (LYRICS_EMBEDDINGS) of a batch of lyrics texts,
+        tensors precomputed by the dataset (lyrics_embeddings in the data
+        params) are used as they are. BERT is not part of the model, it is
+        only loaded when texts are given
+        """
+        if torch.is_tensor(lyrics_x):
+            dims = 2 if self.LYRICS_EMBEDDINGS == POOLED else 3
+            if lyrics_x.dim() != dims:
+                raise Exception("{} takes lyrics_embeddings: {}, got embeddings of shape {}".format(
+                    type(self).__name__, self.LYRICS_EMBEDDINGS, tuple(lyrics_x.shape)))
+            return lyrics_x
+        (tokenizer, bert) = get_bert(BERT_MODEL, self.device)
+        tokens = tokenizer(lyrics_x, padding=True, truncation=False, return_tensors="pt",
+                           return_token_type_ids=False, return_attention_mask=False)['input_ids']
+        with torch.no_grad():
+            out = bert(tokens.to(self.device))
+        return out[1] if self.LYRICS_EMBEDDINGS == POOLED else out[0]
+
+    def on_after_batch_transfer(self, batch, dataloader_idx):
+        # cached features may be stored as int16 PCM / float16, upcast once
+        # they are on the model device
+        (x, y) = batch
+        return (self.take_spectrograms(to_float32(x)), y)
+
+    def take_spectrograms(self, x):
+        """
+        audio of the {"audio", "stft", "mel_spec", ...} items yielded by
+        datasets with spectrograms, the rest is kept for get_spectrogram
+        """
+        self.spectrograms = None
+        if isinstance(x, dict) and "audio" in x:
+            self.spectrograms = (x["audio"], x)
+            return x["audio"]
+        if isinstance(x, (tuple, list)) and len(x) > 0 and isinstance(x[0], dict) and "audio" in x[0]:
+            self.spectrograms = (x[0]["audio"], x[0])
+            return type(x)([x[0]["audio"], *x[1:]])
+        return x
+
+    def get_spectrogram(self, name, x):
+        """
+        output of the front end layer `name` for the audio `x`, taken from the
+        batch when it carries it and the layer is not trainable
+        """
+        if (not self.spectrograms is None and self.spectrograms[0] is x and name in self.spectrograms[1]
+                and not self.config.get(self.SPEC_TRAINABLE, False)):
+            return self.spectrograms[1][name]
+        return getattr(self, name)(x)
+
+    def on_train_epoch_start(self):
+        # streaming datasets and the song sampler reshuffle every epoch
+        if hasattr(self.train_ds, "set_epoch"):
+            self.train_ds.set_epoch(self.current_epoch)
+        if not self.train_sampler is None:
+            self.train_sampler.set_epoch(self.current_epoch)
+
+    def on_train_epoch_end(self):
+        # per-stage loader timings of datasets built with profile=True
+        profiler = getattr(self.train_ds, "profiler", None)
+        if not profiler is None:
+            self.log_dict({"data/{}".format(k): float(v) for (k, v) in profiler.summary().items()})
+            profiler.reset()
+
+    def on_train_end(self):
+        if not self.cache_warmer is None:
+            self.cache_warmer.stop()
+
+    def start_cache_warmer(self):
+        processes = self.config.get(self.CACHE_WARMER, False)
+        if not processes or isinstance(self.train_ds, IterableDataset) or not hasattr(self.train_ds, "precompute"):
+            return
+        if not self.train_sampler is None:
+            indices = [i for b in self.train_sampler.get_batches(self.current_epoch) for i in b]
+        else:
+            indices = range(len(self.train_ds))
+        self.cache_warmer = CacheWarmer(self.train_ds, num_processes=None if processes == True else int(processes))
+        # skip what the loader workers already prefetch
+        self.cache_warmer.start(indices, skip=2 * max(1, self.num_workers) * self.batch_size)
+
+    def get_song_sampler_window(self):
+        window = self.config.get(self.SONG_SAMPLER, False)
+        if not window:
+            return None
+        return SONG_WINDOW if window == True else int(window)
+
     def train_dataloader(self):
         if self.test_ds is None: return None
-        return DataLoader(self.train_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True)
+        window = self.get_song_sampler_window()
+        song_index = None
+        if not window is None and not isinstance(self.train_ds, IterableDataset):
+            song_index = get_song_index(self.train_ds)
+        if not song_index is None:
+            self.train_sampler = SongBatchSampler(song_index, self.batch_size, num_workers=self.num_workers,
+                                                  window=window, drop_last=True)
+            dl = DataLoader(self.train_ds, batch_sampler=self.train_sampler, num_workers=self.num_workers,
+                            collate_fn=get_collate_fn(self.train_ds), worker_init_fn=get_worker_init_fn())
+        else:
+            if hasattr(self.train_ds, "configure_loader"):
+                self.train_ds.configure_loader(self.batch_size, self.num_workers, drop_last=True)
+            dl = DataLoader(self.train_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True,
+                            collate_fn=get_collate_fn(self.train_ds), worker_init_fn=get_worker_init_fn())
+        self.start_cache_warmer()
+        return dl
 
     def val_dataloader(self):
         if self.val_ds is None: return None
-        return DataLoader(self.val_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True)
+        return DataLoader(self.val_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True,
+                          collate_fn=get_collate_fn(self.val_ds), worker_init_fn=get_worker_init_fn())
 
     def test_dataloader(self):
         if self.test_ds is None: return None
-        return DataLoader(self.test_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True)
+        return DataLoader(self.test_ds, batch_size=self.batch_size, num_workers=self.num_workers, drop_last=True,
+                          collate_fn=get_collate_fn(self.test_ds), worker_init_fn=get_worker_init_fn())
 
     def get_check_size(self):
         return (2, 1, 22050 * 5)
@@ -6,14 +6,16 @@ from torch.utils.data import DataLoader
 import torchmetrics as tm
 from nnAudio import Spectrogram
 
+from data.embeddings import SEQUENCE
+from utils.frontend import shared_spectrogram_layers
+from utils.kernel_cache import cached_layer
+
 from models import BaseCatModel
 
-from transformers import BertTokenizer, BertModel
+class ACL1DConvCat_V1(BaseCatModel):
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+    LYRICS_EMBEDDINGS = SEQUENCE
 
-class ACL1DConvCat_V1(BaseCatModel):
-    
     ADAPTIVE_LAYER_UNITS = "adaptive_layer_units"
     N_FFT = "n_fft"
     N_MELS = "n_mels"
@@ -34,18 +36,17 @@ class ACL1DConvCat_V1(BaseCatModel):
     
     def __build_model(self):
 
-        self.bert_tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.bert_model = BertModel.from_pretrained('bert-base-uncased', output_hidden_states=True)
-        self.bert_model = self.bert_model.to(device)
-        for param in self.bert_model.parameters():
-            param.requires_grad = False
-
         f_bins = (self.config[self.N_FFT] // 2) + 1
 
-        self.stft = Spectrogram.STFT(n_fft=self.config[self.N_FFT], fmax=9000, sr=22050, trainable=self.config[self.SPEC_TRAINABLE], output_format="Magnitude")
-        self.mel_spec = Spectrogram.MelSpectrogram(sr=22050, n_fft=self.config[self.N_FFT], n_mels=self.config[self.N_MELS], trainable_mel=self.config[self.SPEC_TRAINABLE], trainable_STFT=self.config[self.SPEC_TRAINABLE])
-        self.mfcc = Spectrogram.MFCC(sr=22050, n_mfcc=self.config[self.N_MFCC])
-        self.cqt = Spectrogram.CQT2010v2(sr=22050, hop_length=512, fmin=32.7, fmax=None, n_bins=self.config[self.N_CQT], filter_scale=1, bins_per_octave=12, norm=True, basis_norm=1, window='hann', pad_mode='reflect', earlydownsample=True, trainable=self.config[self.SPEC_TRAINABLE], output_format='Magnitude')
+        if self.config.get(self.SHARED_STFT, False):
+            (self.stft, self.mel_spec, self.mfcc) = shared_spectrogram_layers(
+                self.config[self.N_FFT], self.config[self.N_MELS], self.config[self.N_MFCC],
+                sr=22050, trainable=self.config[self.SPEC_TRAINABLE])
+        else:
+            self.stft = cached_layer(Spectrogram.STFT, n_fft=self.config[self.N_FFT], fmax=9000, sr=22050, trainable=self.config[self.SPEC_TRAINABLE], output_format="Magnitude")
+            self.mel_spec = cached_layer(Spectrogram.MelSpectrogram, sr=22050, n_fft=self.config[self.N_FFT], n_mels=self.config[self.N_MELS], trainable_mel=self.config[self.SPEC_TRAINABLE], trainable_STFT=self.config[self.SPEC_TRAINABLE])
+            self.mfcc = cached_layer(Spectrogram.MFCC, sr=22050, n_mfcc=self.config[self.N_MFCC])
+        self.cqt = cached_layer(Spectrogram.CQT2010v2, sr=22050, hop_length=512, fmin=32.7, fmax=None, n_bins=self.config[self.N_CQT], filter_scale=1, bins_per_octave=12, norm=True, basis_norm=1, window='hann', pad_mode='reflect', earlydownsample=True, trainable=self.config[self.SPEC_TRAINABLE], output_format='Magnitude')
 
         self.audio_feature_extractor = nn.Sequential(
             nn.Conv1d(in_channels=1, out_channels=250, kernel_size=1024, stride=256),
@@ -229,31 +230,27 @@ class ACL1DConvCat_V1(BaseCatModel):
         raw_x = torch.flatten(raw_x, start_dim=1)
         raw_x = self.audio_fc(raw_x)
 
-        stft_x = self.stft(audio_x)
+        stft_x = self.get_spectrogram("stft", audio_x)
         stft_x = self.stft_feature_extractor(stft_x)
         stft_x = torch.flatten(stft_x, start_dim=1)
         stft_x = self.stft_fc(stft_x)
 
-        mel_x = self.mel_spec(audio_x)
+        mel_x = self.get_spectrogram("mel_spec", audio_x)
         mel_x = self.mel_spec_feature_extractor(mel_x)
         mel_x = torch.flatten(mel_x, start_dim=1)
         mel_x = self.mel_spec_fc(mel_x)
 
-        mfcc_x = self.mfcc(audio_x)
+        mfcc_x = self.get_spectrogram("mfcc", audio_x)
         mfcc_x = self.mfcc_feature_extractor(mfcc_x)
         mfcc_x = torch.flatten(mfcc_x, start_dim=1)
         mfcc_x = self.mfcc_fc(mfcc_x)
 
-        cqt_x = self.cqt(audio_x)
+        cqt_x = self.get_spectrogram("cqt", audio_x)
         cqt_x = self.cqt_feature_extractor(cqt_x)
         cqt_x = torch.flatten(cqt_x, start_dim=1)
         cqt_x = self.cqt_fc(cqt_x)
 
-        lyrics_x = self.bert_tokenizer(lyrics_x, padding=True, truncation=False, return_tensors="pt", return_token_type_ids=False, return_attention_mask=False)['input_ids']
-        lyrics_x = lyrics_x.to(device)
-        with torch.no_grad():
-            lyrics_x = self.bert_model(lyrics_x)
-        lyrics_x = lyrics_x[0]
+        lyrics_x = self.get_lyrics_embedding(lyrics_x)
         (lyrics_x, _) = self.lyrics_extractor(lyrics_x)
         lyrics_x = lyrics_x[:, -1, :]
         lyrics_x = torch.flatten(lyrics_x, start_dim=1)
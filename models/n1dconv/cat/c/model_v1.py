@@ -9,6 +9,9 @@ from torch.utils.data import DataLoader
 import torchmetrics as tm
 from nnAudio import Spectrogram
 
+from utils.frontend import shared_spectrogram_layers
+from utils.kernel_cache import cached_layer
+
 from models import BaseCatModel
 
 class C1DConvCat_V1(BaseCatModel):
@@ -48,9 +51,14 @@ class C1DConvCat_V1(BaseCatModel):
 
         f_bins = (self.config[self.N_FFT] // 2) + 1
 
-        self.stft = Spectrogram.STFT(n_fft=self.config[self.N_FFT], fmax=9000, sr=22050, trainable=self.config[self.SPEC_TRAINABLE], output_format="Magnitude")
-        self.mel_spec = Spectrogram.MelSpectrogram(sr=22050, n_fft=self.config[self.N_FFT], n_mels=self.config[self.N_MELS], trainable_mel=self.config[self.SPEC_TRAINABLE], trainable_STFT=self.config[self.SPEC_TRAINABLE])
-        self.mfcc = Spectrogram.MFCC(sr=22050, n_mfcc=self.config[self.N_MFCC])
+        if self.config.get(self.SHARED_STFT, False):
+            (self.stft, self.mel_spec, self.mfcc) = shared_spectrogram_layers(
+                self.config[self.N_FFT], self.config[self.N_MELS], self.config[self.N_MFCC],
+                sr=22050, trainable=self.config[self.SPEC_TRAINABLE])
+        else:
+            self.stft = cached_layer(Spectrogram.STFT, n_fft=self.config[self.N_FFT], fmax=9000, sr=22050, trainable=self.config[self.SPEC_TRAINABLE], output_format="Magnitude")
+            self.mel_spec = cached_layer(Spectrogram.MelSpectrogram, sr=22050, n_fft=self.config[self.N_FFT], n_mels=self.config[self.N_MELS], trainable_mel=self.config[self.SPEC_TRAINABLE], trainable_STFT=self.config[self.SPEC_TRAINABLE])
+            self.mfcc = cached_layer(Spectrogram.MFCC, sr=22050, n_mfcc=self.config[self.N_MFCC])
 
         self.stft_feature_extractor = nn.Sequential(
 
@@ -126,13 +134,13 @@ class C1DConvCat_V1(BaseCatModel):
 
     def forward(self, x):
 
-        stft_x = self.stft(x)
+        stft_x = self.get_spectrogram("stft", x)
         stft_x = self.stft_feature_extractor(stft_x)
 
-        mel_x = self.mel_spec(x)
+        mel_x = self.get_spectrogram("mel_spec", x)
         mel_x = self.mel_spec_feature_extractor(mel_x)
 
-        mfcc_x = self.mfcc(x)
+        mfcc_x = self.get_spectrogram("mfcc", x)
         mfcc_x = self.mfcc_feature_extractor(mfcc_x)
 
         stft_x = torch.flatten(stft_x, start_dim=1)
@@ -3,11 +3,10 @@ from models import BaseStatModel
 import torch
 import torch.nn as nn
 
-from transformers import BertTokenizer, BertModel
-
 from nnAudio import Spectrogram
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+from utils.frontend import shared_spectrogram_layers
+from utils.kernel_cache import cached_layer
 
 class ACL2DConvStat_V1(BaseStatModel):
 
@@ -31,19 +30,18 @@ class ACL2DConvStat_V1(BaseStatModel):
     
     def __build_model(self):
 
-        self.bert_tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-        self.bert_model = BertModel.from_pretrained('bert-base-uncased', output_hidden_states=False)
-        self.bert_model = self.bert_model.to(device)
-        for param in self.bert_model.parameters():
-            param.requires_grad = False
-
-        self.stft = Spectrogram.STFT(n_fft=self.config[self.N_FFT], fmax=9000, sr=22050,
+        if self.config.get(self.SHARED_STFT, False):
+            (self.stft, self.mel_spec, self.mfcc) = shared_spectrogram_layers(
+                self.config[self.N_FFT], self.config[self.N_MELS], self.config[self.N_MFCC],
+                sr=22050, trainable=self.config[self.SPEC_TRAINABLE])
+        else:
+            self.stft = cached_layer(Spectrogram.STFT, n_fft=self.config[self.N_FFT], fmax=9000, sr=22050,
                                      trainable=self.config[self.SPEC_TRAINABLE], output_format="Magnitude")
-        self.mel_spec = Spectrogram.MelSpectrogram(sr=22050, n_fft=self.config[self.N_FFT],
-                                                   n_mels=self.config[self.N_MELS],
-                                                   trainable_mel=self.config[self.SPEC_TRAINABLE],
-                                                   trainable_STFT=self.config[self.SPEC_TRAINABLE])
-        self.mfcc = Spectrogram.MFCC(sr=22050, n_mfcc=self.config[self.N_MFCC])
+            self.mel_spec = cached_layer(Spectrogram.MelSpectrogram, sr=22050, n_fft=self.config[self.N_FFT],
+                                         n_mels=self.config[self.N_MELS],
+                                         trainable_mel=self.config[self.SPEC_TRAINABLE],
+                                         trainable_STFT=self.config[self.SPEC_TRAINABLE])
+            self.mfcc = cached_layer(Spectrogram.MFCC, sr=22050, n_mfcc=self.config[self.N_MFCC])
 
         self.audio_feature_1d_extractor = nn.Sequential(
             nn.Conv1d(in_channels=1, out_channels=500, kernel_size=1024, stride=256),
@@ -297,17 +295,17 @@ class ACL2DConvStat_V1(BaseStatModel):
         raw_x = self.audio_feature_2d_extractor(raw_x)
         raw_x = torch.flatten(raw_x, start_dim=1)
 
-        stft_x = self.stft(audio_x)
+        stft_x = self.get_spectrogram("stft", audio_x)
         stft_x = torch.unsqueeze(stft_x, dim=1)
         stft_x = self.stft_feature_extractor(stft_x)
         stft_x = torch.flatten(stft_x, start_dim=1)
 
-        mel_x = self.mel_spec(audio_x)
+        mel_x = self.get_spectrogram("mel_spec", audio_x)
         mel_x = torch.unsqueeze(mel_x, dim=1)
         mel_x = self.mel_spec_feature_extractor(mel_x)
         mel_x = torch.flatten(mel_x, start_dim=1)
 
-        mfcc_x = self.mfcc(audio_x)
+        mfcc_x = self.get_spectrogram("mfcc", audio_x)
         mfcc_x = torch.unsqueeze(mfcc_x, dim=1)
         mfcc_x = self.mfcc_feature_extractor(mfcc_x)
         mfcc_x = torch.flatten(mfcc_x, start_dim=1)
@@ -315,12 +313,7 @@ class ACL2DConvStat_V1(BaseStatModel):
         audio_x = torch.cat((raw_x, stft_x, mel_x, mfcc_x), dim=1)
         audio_x = self.fc_audio(audio_x)
 
-        lyrics_x = self.bert_tokenizer(lyrics_x, padding=True, truncation=False, return_tensors="pt", return_token_type_ids=False, return_attention_mask=False)['input_ids']
-        lyrics_x = lyrics_x.to(device)
-        with torch.no_grad():
-            lyrics_x = self.bert_model(lyrics_x)
-        # get pooled output
-        lyrics_x = lyrics_x[1]
+        lyrics_x = self.get_lyrics_embedding(lyrics_x)
         lyrics_x = torch.unsqueeze(lyrics_x, dim=1)
         lyrics_x = self.lyrics_feature_1d_extractor(lyrics_x)
         lyrics_x = torch.unsqueeze(lyrics_x, dim=1)
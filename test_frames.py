@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from data import START_TIME, END_TIME
+from data.base import calculate_frames
+
+
+def calculate_frames_loop(meta, chunk_duration, overlap):
+    # original BaseChunkedDataset.__calculate_frames
+    frames = []
+    row_i = 0
+    for (i, row) in meta.iterrows():
+        start_time = row[START_TIME]
+        end_time = row[END_TIME]
+        duration = end_time - start_time
+        n_frames = int(np.floor((duration - 1) /
+                       (chunk_duration - overlap)))
+        if n_frames == 0 and chunk_duration <= duration:
+            frames.append((row_i, 0))
+            continue
+        for j in range(n_frames):
+            frames.append((row_i, j))
+        row_i += 1
+    return frames
+
+
+def make_meta(n=200, seed=0):
+    rng = np.random.default_rng(seed)
+    starts = rng.choice([0.0, 0.5, 15.0, 30.0], size=n)
+    durations = rng.uniform(0.0, 240.0, size=n)
+    # a few songs right at the edges of the chunking rules
+    durations[:8] = [0.0, 0.5, 1.0, 3.4, 5.0, 5.5, 6.0, 10.0]
+    return pd.DataFrame({START_TIME: starts, END_TIME: starts + durations})
+
+
+def check(meta, chunk_duration, overlap):
+    expected = calculate_frames_loop(meta, chunk_duration, overlap)
+    frames = calculate_frames(meta[START_TIME].to_numpy(dtype=np.float64),
+                              meta[END_TIME].to_numpy(dtype=np.float64),
+                              chunk_duration, overlap)
+    assert frames.shape == (len(expected), 2)
+    assert [tuple(x) for x in frames.tolist()] == expected
+
+
+def test_frames_match_loop():
+    meta = make_meta()
+    for (chunk_duration, overlap) in [(5, 2.5), (10, 5), (5, 0), (5, 0.5), (2, 1.5)]:
+        check(meta, chunk_duration, overlap)
+
+
+def test_frames_empty_meta():
+    meta = pd.DataFrame({START_TIME: [], END_TIME: []})
+    check(meta, 5, 2.5)
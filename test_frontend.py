@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+import torch
+
+from utils.frontend import SharedSTFT, FilterbankView, shared_spectrogram_layers, mel_filters, dct_matrix
+
+SR = 22050
+N_FFT = 1024
+N_MELS = 128
+N_MFCC = 20
+
+
+def make_audio(batch=2, seconds=5, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    t = torch.arange(SR * seconds) / SR
+    tone = torch.sin(2 * np.pi * 440.0 * t) * 0.3
+    return (tone + 0.1 * torch.randn(batch, 1, SR * seconds, generator=g)).float()
+
+
+def assert_close(a, b, rtol=1e-3):
+    a = a.detach().double()
+    b = b.detach().double()
+    assert a.shape == b.shape
+    scale = b.abs().max().item()
+    assert (a - b).abs().max().item() <= rtol * scale
+
+
+def test_mel_from_decimated_stft_matches_own_hop():
+    x = make_audio()
+    filters = mel_filters(SR, N_FFT, N_MELS)
+    shared = FilterbankView(SharedSTFT(N_FFT), filters)
+    own = FilterbankView(SharedSTFT(N_FFT, hop_length=512), filters)
+    assert_close(shared(x), own(x), rtol=1e-5)
+
+
+def test_stft_computed_once_per_batch(monkeypatch):
+    (stft, mel, mfcc) = shared_spectrogram_layers(N_FFT, N_MELS, N_MFCC, shared_mfcc=True)
+    calls = []
+    compute = SharedSTFT.compute
+    monkeypatch.setattr(SharedSTFT, "compute", lambda self, x: calls.append(1) or compute(self, x))
+    x = make_audio()
+    stft(x)
+    mel(x)
+    mfcc(x)
+    assert len(calls) == 1
+    stft(make_audio(seed=1))
+    assert len(calls) == 2
+
+
+def test_dct_is_orthonormal():
+    m = dct_matrix(N_MELS, N_MELS).double()
+    assert torch.allclose(m @ m.T, torch.eye(N_MELS, dtype=torch.double), atol=1e-6)
+
+
+def test_parity_with_nnaudio():
+    Spectrogram = pytest.importorskip("nnAudio.Spectrogram")
+    x = make_audio()
+    (stft, mel, mfcc) = shared_spectrogram_layers(N_FFT, N_MELS, N_MFCC)
+
+    ref_stft = Spectrogram.STFT(n_fft=N_FFT, fmax=9000, sr=SR, trainable=False, output_format="Magnitude")
+    ref_mel = Spectrogram.MelSpectrogram(sr=SR, n_fft=N_FFT, n_mels=N_MELS, trainable_mel=False, trainable_STFT=False)
+    ref_mfcc = Spectrogram.MFCC(sr=SR, n_mfcc=N_MFCC)
+
+    assert_close(stft(x), ref_stft(x))
+    assert_close(mel(x), ref_mel(x))
+    assert_close(mfcc(x), ref_mfcc(x))
+
+
+def test_mel_filters_match_librosa():
+    librosa = pytest.importorskip("librosa")
+    ref = librosa.filters.mel(sr=SR, n_fft=N_FFT, n_mels=N_MELS, htk=False, norm="slaney")
+    assert np.allclose(mel_filters(SR, N_FFT, N_MELS).numpy(), ref, atol=1e-6)
+
+
+def test_batched_stat_features_match_librosa():
+    pytest.importorskip("librosa")
+    from types import SimpleNamespace
+    from data.stat import StatAudioExtractedDataset, StatFeatureCollate
+
+    x = make_audio(batch=3)
+    batch = [(x[i], torch.tensor([0.0])) for i in range(x.shape[0])]
+    ((audio, stft, mel_spec, mfcc), _) = StatFeatureCollate(SR)(batch)
+    assert torch.equal(audio, x)
+
+    # the per item librosa path of StatAudioExtractedDataset.get_features
+    ds = SimpleNamespace(sr=SR)
+    for i in range(x.shape[0]):
+        ref_stft = np.abs(StatAudioExtractedDataset.get_stft(ds, x[i, 0].numpy(), n_fft=N_FFT))
+        ref_mel = StatAudioExtractedDataset.get_mel_spec(ds, ref_stft)
+        ref_mfcc = StatAudioExtractedDataset.get_mfcc(ds, ref_mel)
+        assert_close(stft[i], torch.tensor(ref_stft), rtol=1e-4)
+        assert_close(mel_spec[i], torch.tensor(ref_mel), rtol=1e-4)
+        assert_close(mfcc[i], torch.tensor(ref_mfcc), rtol=1e-4)
+
+
+def test_spectrogram_store_chunks_match_per_chunk_layers(tmp_path):
+    from data import fit_frames
+    from data.spectrogram import SpectrogramStore, MFCC
+    from utils.frontend import power_to_db
+
+    song = make_audio(batch=1, seconds=13)[0]
+    store = SpectrogramStore(str(tmp_path), sr=SR, n_fft=N_FFT, n_mels=N_MELS, n_mfcc=N_MFCC)
+    store.put("song", song)
+    # unaligned start times, the last chunk runs past the end of the song
+    for seconds in [0.0, 2.5, 7.3, 10.0]:
+        offset = store.align(int(SR * seconds))
+        x = fit_frames(SR * 5, song, offset)
+        chunk = store.get_chunk("song", x, offset, song.shape[1])
+        ref = store.compute(x)
+        for (name, frames) in chunk.items():
+            expected = ref[name].T
+            if name == MFCC:
+                expected = torch.matmul(store.dct, power_to_db(expected[None])[0])
+            assert_close(frames, expected, rtol=1e-5)
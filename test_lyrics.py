@@ -0,0 +1,54 @@
+import pylrc
+import pytest
+
+from data.lyrics import LyricsIndex
+
+
+LRC = """[ar:artist]
+[ti:title]
+[00:05.00]second line
+[00:01.50]first line
+[00:10.00]third line
+[00:10.00]third line again
+[00:20.25]last line
+"""
+
+
+@pytest.fixture
+def index(tmp_path):
+    (tmp_path / "1.lrc").write_text(LRC)
+    return LyricsIndex(str(tmp_path), [1, 2])
+
+
+def test_window_is_start_inclusive_end_exclusive(index):
+    # a line belongs to the window when its start time is in [start, end)
+    assert index.get_lyrics_between(1, 0.0, 1.5) == ""
+    assert index.get_lyrics_between(1, 1.5, 5.0) == "first line"
+    assert index.get_lyrics_between(1, 5.0, 10.0) == "second line"
+    assert index.get_lyrics_between(1, 10.0, 10.5) == "third line third line again"
+    assert index.get_lyrics_between(1, 2.0, 30.0) == "second line third line third line again last line"
+    assert index.get_lyrics_between(1, 21.0, 30.0) == ""
+
+
+def test_missing_lyrics_file_is_empty(index):
+    assert 2 in index
+    assert index.get_lyrics_between(2, 0.0, 30.0) == ""
+
+
+def test_cache_round_trip(tmp_path):
+    (tmp_path / "1.lrc").write_text(LRC)
+    cache_dir = str(tmp_path / "cache")
+    a = LyricsIndex(str(tmp_path), [1], cache_dir=cache_dir)
+    b = LyricsIndex(str(tmp_path), [1], cache_dir=cache_dir)
+    assert b.get_lyrics_between(1, 0.0, 30.0) == a.get_lyrics_between(1, 0.0, 30.0)
+
+
+@pytest.mark.parametrize("start_time, end_time", [
+    (0.0, 1.5), (1.5, 5.0), (5.0, 10.0), (10.0, 10.5), (2.0, 30.0), (21.0, 30.0),
+])
+def test_parity_with_get_lyrics_between(index, start_time, end_time):
+    subs = pylrc.parse(LRC)
+    if not hasattr(subs, "getLyricsBetween"):
+        pytest.skip("installed pylrc has no getLyricsBetween")
+    expected = " ".join(x.text for x in subs.getLyricsBetween(start_time, end_time))
+    assert index.get_lyrics_between(1, start_time, end_time) == expected
@@ -0,0 +1,62 @@
+import importlib
+
+import pytest
+import torch
+
+pytest.importorskip("pytorch_lightning")
+pytest.importorskip("torchmetrics")
+pytest.importorskip("nnAudio")
+
+from data.embeddings import POOLED
+
+SR = 22050
+BERT_DIM = 768
+CONFIG = {
+    'dropout': 0.2,
+    'n_fft': 1024,
+    'n_mels': 128,
+    'n_mfcc': 20,
+    'n_cqt': 84,
+    'spec_trainable': False,
+    'adaptive_layer_units': 2,
+    'adaptive_layer_units_0': 2,
+    'adaptive_layer_units_1': 2,
+    'std_activation': "softplus",
+    'audio_hidden_size': 32,
+    'audio_num_layers': 1,
+    'stft_hidden_size': 32,
+    'stft_num_layers': 1,
+    'mel_spec_hidden_size': 32,
+    'mel_spec_num_layers': 1,
+    'mfcc_hidden_size': 32,
+    'mfcc_num_layers': 1,
+}
+
+# (module, class) of the models that take lyrics
+LYRICS_MODELS = [
+    ("models.n1dconv.cat.acl.model_v1", "ACL1DConvCat_V1"),
+    ("models.n1dconv.stat.acl.model_v1", "ACL1DConvStat_V1"),
+    ("models.n1dconv_lstm.stat.acl.model_v1", "ACL1DConvLSTMStat_V1"),
+    ("models.n2dconv.stat.cl.model_v1", "CL2DConvStat_V1"),
+    ("models.n2dconv.stat.acl.model_v1", "ACL2DConvStat_V1"),
+    ("models.n2dconv.d.cl.model_v1", "CL2DConvD_V1"),
+    ("models.n2dconv.d.acl.model_v1", "ACL2DConvD_V1"),
+]
+
+
+@pytest.mark.parametrize("module,name", LYRICS_MODELS)
+def test_lyrics_model_forward(module, name):
+    model_class = getattr(importlib.import_module(module), name)
+    model = model_class(**CONFIG).eval()
+
+    batch = 2
+    audio = torch.rand(batch, 1, SR * 5) * 2 - 1
+    # the precomputed embeddings of the kind the model declares
+    if model_class.LYRICS_EMBEDDINGS == POOLED:
+        lyrics = torch.rand(batch, BERT_DIM)
+    else:
+        lyrics = torch.rand(batch, 16, BERT_DIM)
+    with torch.no_grad():
+        y = model((audio, lyrics))
+    assert y.shape[0] == batch
+    assert torch.isfinite(y).all()
@@ -0,0 +1,68 @@
+import shutil
+import subprocess
+
+import pytest
+import torch
+import torchaudio
+
+from data.mp3_index import Mp3SeekIndex, DECODER_DELAY
+
+SR = 44100
+SECONDS = 10
+CHUNK = 2 * SR
+
+
+def get_ffmpeg():
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        imageio_ffmpeg = pytest.importorskip("imageio_ffmpeg")
+        ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+    return ffmpeg
+
+
+@pytest.fixture(scope="module")
+def mp3_file(tmp_path_factory):
+    """
+    stereo mp3 with an ID3v2 tag and a Xing/Info frame carrying the LAME tag
+    (encoder delay and padding)
+    """
+    audio_file = str(tmp_path_factory.mktemp("mp3") / "song.mp3")
+    subprocess.run([get_ffmpeg(), "-hide_banner", "-loglevel", "error", "-y",
+                    "-f", "lavfi", "-i", "sine=frequency=440:duration={}:sample_rate={}".format(SECONDS, SR),
+                    "-f", "lavfi", "-i", "anoisesrc=d={}:r={}:a=0.1".format(SECONDS, SR),
+                    "-filter_complex", "[0][1]amix=inputs=2,aformat=channel_layouts=stereo",
+                    "-c:a", "libmp3lame", "-b:a", "128k", "-id3v2_version", "3", "-metadata", "title=test",
+                    audio_file], check=True)
+    try:
+        torchaudio.load(audio_file)
+    except Exception as e:
+        pytest.skip("torchaudio can not decode mp3 here: {}".format(e))
+    return audio_file
+
+
+def test_index_skips_tags_and_reads_the_encoder_delay(mp3_file):
+    with open(mp3_file, mode="rb") as f:
+        assert f.read(3) == b"ID3"
+    index = Mp3SeekIndex.build(mp3_file)
+    (full, _) = torchaudio.load(mp3_file)
+    assert index.sr == SR
+    assert index.skip > DECODER_DELAY
+    assert index.num_frames == full.shape[1]
+
+
+@pytest.mark.parametrize("where", ["first", "early", "middle", "last"])
+def test_chunks_match_full_decode(mp3_file, where):
+    index = Mp3SeekIndex.build(mp3_file)
+    (full, _) = torchaudio.load(mp3_file)
+    offset = {
+        'first': 0,
+        'early': 1000,
+        'middle': full.shape[1] // 2 + 17,
+        'last': full.shape[1] - CHUNK
+    }[where]
+    (x, sr) = index.load(mp3_file, frame_offset=offset, num_frames=CHUNK)
+    (ref, _) = torchaudio.load(mp3_file, frame_offset=offset, num_frames=CHUNK)
+    assert sr == SR
+    assert x.shape == ref.shape
+    assert torch.allclose(x, ref, atol=1e-6)
+    assert torch.allclose(x, full[:, offset:offset + CHUNK], atol=1e-6)
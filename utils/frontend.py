@@ -0,0 +1,252 @@
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+# defaults of the nnAudio layers used by the models
+MEL_HOP_LENGTH = 512
+MFCC_N_FFT = 2048
+MFCC_N_MELS = 128
+TOP_DB = 80.0
+AMIN = 1e-10
+
+
+def hann_window(n):
+    # periodic, same as scipy.signal.get_window("hann", n, fftbins=True)
+    return 0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n) / n)
+
+
+def fourier_kernels(n_fft):
+    """
+    (cos, sin) conv1d kernels of shape (n_fft // 2 + 1, 1, n_fft), windowed
+    """
+    freq_bins = n_fft // 2 + 1
+    s = np.arange(n_fft)
+    k = np.arange(freq_bins)[:, None]
+    window = hann_window(n_fft)
+    wcos = window * np.cos(2 * np.pi * k * s / n_fft)
+    wsin = window * np.sin(2 * np.pi * k * s / n_fft)
+    return (torch.tensor(wcos[:, None, :], dtype=torch.float), torch.tensor(wsin[:, None, :], dtype=torch.float))
+
+
+def hz_to_mel(f):
+    # slaney scale: linear below 1 kHz, logarithmic above
+    f = np.asanyarray(f, dtype=np.float64)
+    f_sp = 200.0 / 3
+    mels = f / f_sp
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(f >= min_log_hz, min_log_mel + np.log(np.maximum(f, min_log_hz) / min_log_hz) / logstep, mels)
+
+
+def mel_to_hz(m):
+    m = np.asanyarray(m, dtype=np.float64)
+    f_sp = 200.0 / 3
+    freqs = f_sp * m
+    min_log_hz = 1000.0
+    min_log_mel = min_log_hz / f_sp
+    logstep = np.log(6.4) / 27.0
+    return np.where(m >= min_log_mel, min_log_hz * np.exp(logstep * (m - min_log_mel)), freqs)
+
+
+def mel_filters(sr, n_fft, n_mels=128, fmin=0.0, fmax=None):
+    """
+    slaney mel filterbank with area normalization (librosa.filters.mel with
+    htk=False, norm=1), shape (n_mels, n_fft // 2 + 1)
+    """
+    if fmax is None:
+        fmax = sr / 2.0
+    fftfreqs = np.linspace(0, sr / 2.0, 1 + n_fft // 2)
+    mel_f = mel_to_hz(np.linspace(hz_to_mel(fmin), hz_to_mel(fmax), n_mels + 2))
+    fdiff = np.diff(mel_f)
+    ramps = mel_f[:, None] - fftfreqs[None, :]
+    lower = -ramps[:n_mels] / fdiff[:n_mels, None]
+    upper = ramps[2:n_mels + 2] / fdiff[1:n_mels + 1, None]
+    weights = np.maximum(0, np.minimum(lower, upper))
+    weights *= (2.0 / (mel_f[2:n_mels + 2] - mel_f[:n_mels]))[:, None]
+    return torch.tensor(weights, dtype=torch.float)
+
+
+def log_freq_filters(sr, n_fft, n_bins=84, fmin=32.7, bins_per_octave=12):
+    """
+    triangular filters on a log frequency axis (a cheap CQT-like view of the
+    STFT, low bins are coarse as they are limited by n_fft), shape (n_bins, n_fft // 2 + 1)
+    """
+    fftfreqs = np.linspace(0, sr / 2.0, 1 + n_fft // 2)
+    centers = fmin * 2.0 ** (np.arange(-1, n_bins + 1) / bins_per_octave)
+    weights = np.zeros((n_bins, len(fftfreqs)))
+    for i in range(n_bins):
+        (lo, c, hi) = centers[i:i + 3]
+        up = (fftfreqs - lo) / (c - lo)
+        down = (hi - fftfreqs) / (hi - c)
+        weights[i] = np.maximum(0, np.minimum(up, down))
+        if weights[i].sum() == 0:
+            # narrower than one fft bin, take the nearest bin
+            weights[i, np.argmin(np.abs(fftfreqs - c))] = 1.0
+    return torch.tensor(weights, dtype=torch.float)
+
+
+def dct_matrix(n, n_out):
+    """
+    orthonormal DCT-II as a (n_out, n) matrix
+    """
+    k = np.arange(n_out)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * k * (2 * i + 1) / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return torch.tensor(m, dtype=torch.float)
+
+
+def power_to_db(x, top_db=TOP_DB, amin=AMIN):
+    """
+    10 * log10 with the floor at top_db below the maximum of every item
+    """
+    x = 10.0 * torch.log10(torch.clamp(x, min=amin))
+    if not top_db is None:
+        peak = x.flatten(1).max(1)[0].view(-1, *([1] * (x.dim() - 1)))
+        x = torch.max(x, peak - top_db)
+    return x
+
+
+class SharedSTFT(nn.Module):
+    """
+    power spectrogram computed with conv1d (center, reflect padding, periodic
+    hann window) like nnAudio. the result of the last input is kept until all
+    `consumers` have read it, so the magnitude/mel/mfcc views of one forward
+    pass share a single STFT
+    """
+
+    def __init__(self, n_fft, hop_length=None, trainable=False):
+        super().__init__()
+        self.n_fft = n_fft
+        self.hop_length = n_fft // 4 if hop_length is None else hop_length
+        self.trainable = trainable
+        (wcos, wsin) = fourier_kernels(n_fft)
+        if trainable:
+            self.wcos = nn.Parameter(wcos)
+            self.wsin = nn.Parameter(wsin)
+        else:
+            self.register_buffer("wcos", wcos)
+            self.register_buffer("wsin", wsin)
+        self.consumers = 0
+        self.last = None
+
+    def compute(self, x):
+        if x.dim() == 2:
+            x = torch.unsqueeze(x, 1)
+        x = F.pad(x, (self.n_fft // 2, self.n_fft // 2), mode="reflect")
+        real = F.conv1d(x, self.wcos, stride=self.hop_length)
+        imag = F.conv1d(x, self.wsin, stride=self.hop_length)
+        return real.pow(2) + imag.pow(2)
+
+    def forward(self, x):
+        if not self.last is None and self.last[0] is x and self.last[1] == x._version:
+            (_, _, power, uses) = self.last
+        else:
+            (power, uses) = (self.compute(x), 0)
+        uses += 1
+        self.last = None if uses >= self.consumers else (x, x._version, power, uses)
+        return power
+
+    def add_consumer(self):
+        self.consumers += 1
+        return self
+
+
+class MagnitudeView(nn.Module):
+    """
+    same output as nnAudio Spectrogram.STFT(output_format="Magnitude")
+    """
+
+    def __init__(self, stft):
+        super().__init__()
+        self.stft = stft.add_consumer()
+
+    def forward(self, x):
+        power = self.stft(x)
+        if self.stft.trainable:
+            # no nan gradient for sqrt(0)
+            return torch.sqrt(power + 1e-8)
+        return torch.sqrt(power)
+
+
+class FilterbankView(nn.Module):
+    """
+    filterbank (mel, log frequency) over the power spectrogram at
+    `hop_length`, taken from a shared STFT with a hop that divides it.
+    same output as nnAudio Spectrogram.MelSpectrogram for mel filters
+    """
+
+    def __init__(self, stft, filters, hop_length=MEL_HOP_LENGTH, trainable=False, magnitude=False):
+        super().__init__()
+        if hop_length % stft.hop_length != 0:
+            raise Exception("Hop length {} is not a multiple of the STFT hop {}".format(hop_length, stft.hop_length))
+        self.stft = stft.add_consumer()
+        self.step = hop_length // stft.hop_length
+        self.magnitude = magnitude
+        if trainable:
+            self.filters = nn.Parameter(filters)
+        else:
+            self.register_buffer("filters", filters)
+
+    def forward(self, x):
+        power = self.stft(x)[:, :, ::self.step]
+        if self.stft.trainable:
+            power = power + 1e-8
+        if self.magnitude:
+            power = torch.sqrt(power)
+        return torch.matmul(self.filters, power)
+
+
+class MFCCView(nn.Module):
+    """
+    same output as nnAudio Spectrogram.MFCC: mel power in dB (top_db per
+    item) followed by an orthonormal DCT-II
+    """
+
+    def __init__(self, mel, n_mfcc):
+        super().__init__()
+        self.mel = mel
+        self.register_buffer("dct", dct_matrix(mel.filters.shape[0], n_mfcc))
+
+    def forward(self, x):
+        x = power_to_db(self.mel(x))
+        return torch.matmul(self.dct, x)
+
+
+def shared_spectrogram_layers(n_fft, n_mels, n_mfcc, sr=22050, trainable=False, shared_mfcc=False):
+    """
+    (stft, mel_spec, mfcc) layers that replace
+
+        Spectrogram.STFT(n_fft, sr=sr, trainable=trainable, output_format="Magnitude")
+        Spectrogram.MelSpectrogram(sr=sr, n_fft=n_fft, n_mels=n_mels, trainable_mel=trainable, trainable_STFT=trainable)
+        Spectrogram.MFCC(sr=sr, n_mfcc=n_mfcc)
+
+    with a single STFT for magnitude and mel (mel hop 512 is every other
+    frame of hop n_fft // 4 for n_fft 1024). MFCC uses n_fft 2048, so it
+    gets an STFT of its own unless n_fft is 2048 or `shared_mfcc` derives it
+    from the shared one (not equal to the nnAudio output then).
+    the trainable STFT kernels are shared by the magnitude and mel views
+    """
+    stft = SharedSTFT(n_fft, trainable=trainable)
+    magnitude = MagnitudeView(stft)
+    mel = FilterbankView(stft, mel_filters(sr, n_fft, n_mels), trainable=trainable)
+
+    if shared_mfcc or n_fft == MFCC_N_FFT:
+        mfcc_stft = stft
+        n_mfcc_fft = n_fft
+    else:
+        mfcc_stft = SharedSTFT(MFCC_N_FFT, hop_length=MEL_HOP_LENGTH)
+        n_mfcc_fft = MFCC_N_FFT
+    mfcc = MFCCView(FilterbankView(mfcc_stft, mel_filters(sr, n_mfcc_fft, MFCC_N_MELS)), n_mfcc)
+    return (magnitude, mel, mfcc)
+
+
+def log_freq_layer(stft, sr=22050, n_bins=84, fmin=32.7, hop_length=MEL_HOP_LENGTH, trainable=False):
+    """
+    CQT-like magnitude view from a shared STFT, an approximation of
+    Spectrogram.CQT2010v2 (not numerically equal to it)
+    """
+    return FilterbankView(stft, log_freq_filters(sr, stft.n_fft, n_bins, fmin), hop_length=hop_length,
+                          trainable=trainable, magnitude=True)
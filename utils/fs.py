@@ -0,0 +1,19 @@
+import os
+import stat
+
+
+def is_private(name):
+    # owned by the current user and not writable by anyone else
+    st = os.stat(name)
+    return st.st_uid == os.getuid() and (st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)) == 0
+
+
+def make_private_dir(folder):
+    """
+    create `folder` readable by the current user only, an existing one must
+    be private already as pickles in it are loaded
+    """
+    os.makedirs(folder, mode=0o700, exist_ok=True)
+    if not is_private(folder):
+        raise Exception("{} is not private to the current user".format(folder))
+    return folder
@@ -0,0 +1,81 @@
+import copy
+import hashlib
+import json
+import os
+import sys
+from os import path
+
+import torch
+
+from utils.fs import is_private, make_private_dir
+
+# folder of the pickled layers, None keeps them in memory only (exec.py sets
+# it to a folder of the current user under <temp_dir>)
+CACHE_DIR = None
+
+_layers = {}
+
+
+def set_cache_dir(cache_dir):
+    global CACHE_DIR
+    CACHE_DIR = cache_dir
+
+
+def get_user_cache_dir(root):
+    return path.join(root, "kernels-{}".format(os.getuid()))
+
+
+def _save_layer(layer, cache_file):
+    try:
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        torch.save(layer, tmp_file)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        print("Warning: failed to cache layer {}".format(e))
+
+
+def get_layer_key(layer_class, kwargs):
+    package = sys.modules[layer_class.__module__.split(".")[0]]
+    return json.dumps({
+        'class': "{}.{}".format(layer_class.__module__, layer_class.__name__),
+        'version': getattr(package, "__version__", None),
+        'torch': torch.__version__,
+        'kwargs': kwargs
+    }, sort_keys=True, default=str)
+
+
+def cached_layer(layer_class, **kwargs):
+    """
+    layer_class(**kwargs) with its filter banks/kernels built once: the first
+    instance is kept per process and saved to CACHE_DIR, later processes load
+    it from there instead of building it. every call returns a deep copy so
+    models never share parameters
+    """
+    key = get_layer_key(layer_class, kwargs)
+    if not key in _layers:
+        layer = None
+        cache_file = None
+        if not CACHE_DIR is None:
+            h = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+            cache_file = path.join(CACHE_DIR, "{}-{}.pt".format(layer_class.__name__, h))
+            try:
+                make_private_dir(CACHE_DIR)
+            except Exception as e:
+                print("Warning: not caching layers - {}".format(e))
+                cache_file = None
+        # the file restores a whole module (pickle), it is only trusted in a
+        # folder nobody else can write to
+        if not cache_file is None and path.exists(cache_file) and is_private(cache_file):
+            try:
+                layer = torch.load(cache_file, map_location="cpu", weights_only=False)
+                if not isinstance(layer, layer_class):
+                    raise Exception("expected {} got {}".format(layer_class.__name__, type(layer).__name__))
+            except Exception as e:
+                print("Warning: failed to load cached layer {}. building... {}".format(cache_file, e))
+                layer = None
+        if layer is None:
+            layer = layer_class(**kwargs)
+            if not cache_file is None:
+                _save_layer(layer, cache_file)
+        _layers[key] = layer
+    return copy.deepcopy(_layers[key])
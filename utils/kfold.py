@@ -11,18 +11,23 @@ import os
 
 from yaml import load
 
+from data.resample import get_collate_fn
+from data.sampler import SongBatchSampler, get_song_index
+
 class KFoldHelper:
     """Split data for (Stratified) K-Fold Cross-Validation."""
     def __init__(self,
                  n_splits=5,
                  stratify=False,
                  batch_size=16,
-                 num_workers=4):
+                 num_workers=4,
+                 song_sampler_window=None):
         super().__init__()
         self.n_splits = n_splits
         self.stratify = stratify
         self.batch_size = batch_size
         self.num_workers = num_workers
+        self.song_sampler_window = song_sampler_window
 
     def __call__(self, data):
         if self.stratify:
@@ -33,21 +38,35 @@ class KFoldHelper:
             splitter = KFold(n_splits=self.n_splits)
 
         n_samples = len(data)
+        collate_fn = get_collate_fn(data)
         for train_idx, val_idx in splitter.split(X=range(n_samples), y=labels):
 
             train_dataset = Subset(data, train_idx)
-            train_loader = DataLoader(dataset=train_dataset,
-                                      batch_size=self.batch_size,
-                                      shuffle=False,
-                                      drop_last=True,
-                                      num_workers=self.num_workers)
+            song_index = None
+            if not self.song_sampler_window is None:
+                song_index = get_song_index(train_dataset)
+            if not song_index is None:
+                sampler = SongBatchSampler(song_index, self.batch_size, num_workers=self.num_workers,
+                                           window=self.song_sampler_window, drop_last=True)
+                train_loader = DataLoader(dataset=train_dataset,
+                                          batch_sampler=sampler,
+                                          num_workers=self.num_workers,
+                                          collate_fn=collate_fn)
+            else:
+                train_loader = DataLoader(dataset=train_dataset,
+                                          batch_size=self.batch_size,
+                                          shuffle=False,
+                                          drop_last=True,
+                                          num_workers=self.num_workers,
+                                          collate_fn=collate_fn)
 
             val_dataset = Subset(data, val_idx)
             val_loader = DataLoader(dataset=val_dataset,
                                     batch_size=self.batch_size,
                                     shuffle=False,
                                     drop_last=True,
-                                    num_workers=self.num_workers)
+                                    num_workers=self.num_workers,
+                                    collate_fn=collate_fn)
 
             yield train_loader, val_loader
 
@@ -69,6 +88,7 @@ class CrossValidator:
                  config={},
                  use_wandb=True,
                  cv_dry_run=False,
+                 song_sampler_window=None,
                  *trainer_args,
                  **trainer_kwargs):
         super().__init__()
@@ -81,6 +101,7 @@ class CrossValidator:
         self.wandb_tags = wandb_tags
         self.wandb_project_name = wandb_project_name
         self.max_runs = max_runs
+        self.song_sampler_window = song_sampler_window
 
         self.run_name = generate_slug(2)
         if wandb_group is None:
@@ -112,8 +133,10 @@ class CrossValidator:
             n_splits=self.n_splits,
             stratify=self.stratify,
             batch_size=self.batch_size,
-            num_workers=self.num_workers)
-        test_dl = DataLoader(test_data, batch_size=self.batch_size, num_workers=self.num_workers)
+            num_workers=self.num_workers,
+            song_sampler_window=self.song_sampler_window)
+        test_dl = DataLoader(test_data, batch_size=self.batch_size, num_workers=self.num_workers,
+                             collate_fn=get_collate_fn(test_data))
 
         print("KFoldHelper: Splitting dataset into {} folds".format(self.n_splits))
         cv_data = split_func(data)